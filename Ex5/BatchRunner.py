@@ -0,0 +1,345 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in  
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0 
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import argparse
+import concurrent.futures
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import typing
+import xml.etree.ElementTree
+from Main import run_program, DEFAULT_MAX_CYCLES
+from ScreenSnapshot import ScreenSnapshot
+
+# The tools of the other projects, that build the programs:
+PROJECTS_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__)))
+COMPILER = os.path.join(PROJECTS_DIRECTORY, "Ex11", "JackCompiler.py")
+TRANSLATOR = os.path.join(PROJECTS_DIRECTORY, "Ex8", "Main.py")
+ASSEMBLER = os.path.join(PROJECTS_DIRECTORY, "Ex6", "Main.py")
+DEFAULT_TIMEOUT = 600  # seconds, for every build stage.
+PASSED = "passed"
+FAILED = "failed"  # an assertion failed.
+ERROR = "error"  # the program could not be built or run.
+
+
+def read_manifest(manifest_file: typing.TextIO, directory: str) -> \
+        typing.List[typing.Dict]:
+    """Reads a manifest of test programs: a JSON object whose "tests" are
+    objects of the form
+    {"name": "Square", "path": "Square", "max_cycles": 1000000,
+    "set": {"0": 256}, "keys": {"50000": 131}, "idle": true, "halt": true,
+    "ram": {"8000": -1}, "screen": "Square.pbm", "libraries": ["os"]}.
+    Only "path" is required: a directory of .jack or .vm files, or a .jack,
+    .vm, .asm or .hack file. The RAM words of "set" are written before the
+    run, "keys" are key events (see Main.run_program), "idle" skips idle
+    loops and detects halts (see IdleDetector), "halt" requires the program
+    to halt within the cycle budget (with "idle", since only IdleDetector
+    detects the halt of a Jack program), "ram" and "screen" are the
+    expected RAM words and screen (a PBM image, as written by ScreenSnapshot)
+    after the run, and the .vm files of the "libraries" directories (like a
+    compiled OS) are added to the program, unless it has files of the same
+    names. The manifest itself may have "libraries" for all of its tests.
+
+    Args:
+        manifest_file (typing.TextIO): the manifest.
+        directory (str): the directory that the paths in the manifest are
+        relative to.
+
+    Returns:
+        typing.List[typing.Dict]: the tests, with absolute paths, and with a
+        name (by default, the name of the program).
+
+    Raises:
+        ValueError: if a test has "halt" without "idle".
+    """
+    manifest = json.load(manifest_file)
+    tests = list()
+    for test in manifest["tests"]:
+        test = dict(test)
+        if test.get("halt", False) and not test.get("idle", False):
+            raise ValueError("test {} has \"halt\" without \"idle\"".format(
+                test.get("name", test["path"])))
+        test["path"] = os.path.join(directory, test["path"])
+        test.setdefault("name", os.path.splitext(os.path.basename(
+            os.path.normpath(test["path"])))[0])
+        test["libraries"] = [os.path.join(directory, library) for library in
+                             test.get("libraries",
+                                      manifest.get("libraries", []))]
+        if "screen" in test:
+            test["screen"] = os.path.join(directory, test["screen"])
+        tests.append(test)
+    return tests
+
+
+def build_program(source_path: str, directory: str,
+                  libraries: typing.List[str] = (),
+                  timeout: float = DEFAULT_TIMEOUT) -> str:
+    """Copies a program into a directory and builds it, with the tools of
+    the other projects: .jack files are compiled, .vm files are translated
+    and the assembly is assembled. Every tool runs in its own process, since
+    the tools share module names.
+
+    Args:
+        source_path (str): a directory of .jack or .vm files, or a .jack,
+        .vm, .asm or .hack file.
+        directory (str): an empty directory to build the program in.
+        libraries (typing.List[str]): directories of .vm files to add to a
+        Jack or VM program.
+        timeout (float): the number of seconds that every tool may run.
+
+    Returns:
+        str: the path of the .hack file.
+    """
+    name = os.path.splitext(os.path.basename(os.path.normpath(
+        source_path)))[0]
+    program_directory = os.path.join(directory, name)
+    if os.path.isdir(source_path):
+        shutil.copytree(source_path, program_directory)
+    else:
+        os.mkdir(program_directory)
+        shutil.copy(source_path, program_directory)
+    extensions = set(os.path.splitext(filename)[1].lower()
+                     for filename in os.listdir(program_directory))
+    if ".jack" in extensions:
+        _run_tool(COMPILER, program_directory, timeout)
+    if ".jack" in extensions or ".vm" in extensions:
+        for library in libraries:
+            for filename in os.listdir(library):
+                if filename.lower().endswith(".vm") and not os.path.exists(
+                        os.path.join(program_directory, filename)):
+                    shutil.copy(os.path.join(library, filename),
+                                program_directory)
+        _run_tool(TRANSLATOR, program_directory, timeout)
+    program_path = os.path.join(program_directory, name)
+    if ".hack" not in extensions or ".jack" in extensions or \
+            ".vm" in extensions:
+        _run_tool(ASSEMBLER, program_path + ".asm", timeout)
+    return program_path + ".hack"
+
+
+def run_test(test: typing.Dict, max_cycles: int = DEFAULT_MAX_CYCLES,
+             timeout: float = DEFAULT_TIMEOUT) -> typing.Dict:
+    """Builds and runs a test program (with compiled basic blocks) in a
+    temporary directory, and checks its assertions. Errors are reported in
+    the result rather than raised, so a test cannot stop the others.
+
+    Args:
+        test (typing.Dict): a test, as returned by read_manifest.
+        max_cycles (int): the cycle budget of a test that has no
+        "max_cycles".
+        timeout (float): the number of seconds that every build tool may
+        run.
+
+    Returns:
+        typing.Dict: the name, the status (PASSED, FAILED or ERROR), the
+        failures or the error, the number of cycles, whether the program
+        halted, and the seconds that the build and the run took.
+    """
+    result = {"name": test["name"], "status": PASSED, "failures": [],
+              "cycles": 0, "halted": False, "build_seconds": 0.0,
+              "run_seconds": 0.0}
+    max_cycles = test.get("max_cycles", max_cycles)
+    start = time.perf_counter()
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            program_path = build_program(test["path"], directory,
+                                         test["libraries"], timeout)
+            result["build_seconds"] = time.perf_counter() - start
+            start = time.perf_counter()
+            emulator, halted = run_program(
+                program_path, max_cycles,
+                [(int(address, 0), value & 0xFFFF)
+                 for address, value in test.get("set", {}).items()],
+                [(int(cycle, 0), code)
+                 for cycle, code in test.get("keys", {}).items()],
+                jit=True, idle=test.get("idle", False))
+            result["run_seconds"] = time.perf_counter() - start
+        result.update({"cycles": emulator.cycles, "halted": halted})
+        result["failures"] = _check_assertions(test, emulator, halted,
+                                               max_cycles)
+    except subprocess.TimeoutExpired as error:
+        result.update({"status": ERROR, "error": "{} timed out after {} "
+                                                 "seconds".format(
+                           os.path.relpath(error.cmd[1], PROJECTS_DIRECTORY),
+                           error.timeout)})
+        return result
+    except Exception as error:
+        result.update({"status": ERROR,
+                       "error": "{}: {}".format(type(error).__name__, error)})
+        return result
+    if result["failures"]:
+        result["status"] = FAILED
+    return result
+
+
+def run_tests(tests: typing.List[typing.Dict], jobs: int = 0,
+              max_cycles: int = DEFAULT_MAX_CYCLES,
+              timeout: float = DEFAULT_TIMEOUT,
+              progress: typing.Optional[typing.TextIO] = None) -> \
+        typing.List[typing.Dict]:
+    """Runs tests, spread across a pool of processes.
+
+    Args:
+        tests (typing.List[typing.Dict]): the tests, as returned by
+        read_manifest.
+        jobs (int): the number of processes to use, or 0 to use one process
+        per CPU.
+        max_cycles (int): as in run_test.
+        timeout (float): as in run_test.
+        progress (typing.Optional[typing.TextIO]): if given, a line is
+        written to this file whenever a test ends.
+
+    Returns:
+        typing.List[typing.Dict]: the results of the tests (see run_test), in
+        the order of the tests.
+    """
+    results = [None] * len(tests)
+    with concurrent.futures.ProcessPoolExecutor(jobs or None) as executor:
+        futures = {executor.submit(run_test, test, max_cycles, timeout): i
+                   for i, test in enumerate(tests)}
+        for future in concurrent.futures.as_completed(futures):
+            result = results[futures[future]] = future.result()
+            if progress is not None:
+                progress.write("{:<7} {} ({} cycles, {:.2f}s)\n".format(
+                    result["status"].upper(), result["name"],
+                    result["cycles"], result["build_seconds"] +
+                    result["run_seconds"]))
+                progress.flush()
+    return results
+
+
+def write_junit(results: typing.List[typing.Dict],
+                output_file: typing.BinaryIO,
+                suite_name: str = "BatchRunner") -> None:
+    """Writes results as a JUnit XML report.
+
+    Args:
+        results (typing.List[typing.Dict]): the results of run_tests.
+        output_file (typing.BinaryIO): the file to write to.
+        suite_name (str): the name of the test suite.
+    """
+    suite = xml.etree.ElementTree.Element("testsuite", {
+        "name": suite_name, "tests": str(len(results)),
+        "failures": str(sum(result["status"] == FAILED
+                            for result in results)),
+        "errors": str(sum(result["status"] == ERROR for result in results)),
+        "time": "{:.3f}".format(sum(result["build_seconds"] +
+                                    result["run_seconds"]
+                                    for result in results))})
+    for result in results:
+        case = xml.etree.ElementTree.SubElement(suite, "testcase", {
+            "classname": suite_name, "name": result["name"],
+            "time": "{:.3f}".format(result["build_seconds"] +
+                                    result["run_seconds"])})
+        if result["status"] == FAILED:
+            failure = xml.etree.ElementTree.SubElement(case, "failure", {
+                "message": result["failures"][0]})
+            failure.text = "\n".join(result["failures"])
+        elif result["status"] == ERROR:
+            xml.etree.ElementTree.SubElement(case, "error", {
+                "message": result["error"]})
+    xml.etree.ElementTree.ElementTree(suite).write(output_file, "utf-8",
+                                                   xml_declaration=True)
+
+
+# HELP METHODS:
+
+def _run_tool(script, input_path, timeout):
+    """Runs a tool of another project on a path, in the directory of the
+    tool, and raises a RuntimeError with its output if it fails."""
+    completed = subprocess.run(
+        [sys.executable, script, input_path], cwd=os.path.dirname(script),
+        stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+        universal_newlines=True, timeout=timeout)
+    if completed.returncode:
+        raise RuntimeError("{} failed on {}:\n{}".format(
+            os.path.relpath(script, PROJECTS_DIRECTORY),
+            os.path.basename(input_path), completed.stdout.strip()))
+
+
+def _check_assertions(test, emulator, halted, max_cycles):
+    """Returns a description of every assertion of a test that the machine
+    does not satisfy after its run."""
+    failures = list()
+    if test.get("halt", False) and not halted:
+        failures.append("did not halt within {} cycles".format(max_cycles))
+    for address, expected in test.get("ram", {}).items():
+        actual = emulator.ram[int(address, 0)]
+        if actual != expected & 0xFFFF:
+            failures.append("RAM[{}] = {}, expected {}".format(
+                address, actual - 0x10000 if actual & 0x8000 else actual,
+                expected))
+    if "screen" in test:
+        image = io.BytesIO()
+        ScreenSnapshot.write(emulator.ram, image)
+        with open(test["screen"], 'rb') as expected_file:
+            expected_image = expected_file.read()
+        if image.getvalue() != expected_image:
+            if len(image.getvalue()) != len(expected_image):
+                failures.append("{} is not a 512x256 PBM image".format(
+                    os.path.basename(test["screen"])))
+            else:
+                pixels = sum(bin(actual ^ expected).count("1")
+                             for actual, expected in
+                             zip(image.getvalue(), expected_image))
+                failures.append("{} pixels differ from {}".format(
+                    pixels, os.path.basename(test["screen"])))
+    return failures
+
+
+if "__main__" == __name__:
+    # Runs the tests of a manifest, and writes their results as JSON and as a
+    # JUnit report. Fails if any test did not pass.
+    arguments_parser = argparse.ArgumentParser(
+        prog="BatchRunner", description="Builds and runs the test programs "
+                                        "of a manifest in parallel, and "
+                                        "checks their results.")
+    arguments_parser.add_argument("manifest_path")
+    arguments_parser.add_argument(
+        "-j", "--jobs", type=int, default=0,
+        help="the number of processes to use (by default, one per CPU)")
+    arguments_parser.add_argument(
+        "--max-cycles", type=int, default=DEFAULT_MAX_CYCLES, metavar="N",
+        help="the cycle budget of the tests that do not set max_cycles")
+    arguments_parser.add_argument(
+        "--timeout", type=float, default=DEFAULT_TIMEOUT, metavar="SECONDS",
+        help="the time that the compiler, the VM translator or the assembler "
+             "may take on a program")
+    arguments_parser.add_argument(
+        "--json", metavar="PATH", help="write the results to this JSON file")
+    arguments_parser.add_argument(
+        "--junit", metavar="PATH", help="write a JUnit XML report to this "
+                                        "file")
+    arguments = arguments_parser.parse_args()
+    manifest_path = os.path.abspath(arguments.manifest_path)
+    with open(manifest_path, 'r') as manifest_input:
+        try:
+            manifest_tests = read_manifest(manifest_input,
+                                           os.path.dirname(manifest_path))
+        except ValueError as manifest_error:
+            arguments_parser.error(str(manifest_error))
+    test_results = run_tests(manifest_tests, arguments.jobs,
+                             arguments.max_cycles, arguments.timeout,
+                             sys.stdout)
+    if arguments.json:
+        with open(arguments.json, 'w') as json_file:
+            json.dump({"manifest": manifest_path, "results": test_results},
+                      json_file, indent=2)
+    if arguments.junit:
+        with open(arguments.junit, 'wb') as junit_file:
+            write_junit(test_results, junit_file, os.path.splitext(
+                os.path.basename(manifest_path))[0])
+    not_passed = sum(result["status"] != PASSED for result in test_results)
+    print("{} passed, {} failed".format(len(test_results) - not_passed,
+                                        not_passed))
+    if not_passed:
+        sys.exit(1)
@@ -0,0 +1,270 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in  
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0 
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import collections
+import typing
+from CPUEmulator import CPUEmulator, ALU, ROM_SIZE, KBD, ADDRESS_MASK, \
+    C_INSTRUCTION_BIT, REGULAR_ALU_BITS, A_BIT, STORE_A_BIT, STORE_D_BIT, \
+    STORE_M_BIT
+from PerformanceCounters import PerformanceCounters, CYCLES, JUMPS_TAKEN, \
+    JUMPS_NOT_TAKEN, SHIFTS
+
+# A block ends after its first jump instruction, or after this many
+# instructions (a long run of unused ROM is a single block otherwise):
+MAX_BLOCK_LENGTH = 256
+# Python expressions for the documented comp bits (see ALU_FUNCTIONS), where
+# {x} is D and {y} is A or M:
+ALU_EXPRESSIONS = {
+    0b101010: "0",
+    0b111111: "1",
+    0b111010: "65535",
+    0b001100: "{x}",
+    0b110000: "{y}",
+    0b001101: "{x} ^ 65535",
+    0b110001: "{y} ^ 65535",
+    0b001111: "-{x} & 65535",
+    0b110011: "-{y} & 65535",
+    0b011111: "({x} + 1) & 65535",
+    0b110111: "({y} + 1) & 65535",
+    0b001110: "({x} - 1) & 65535",
+    0b110010: "({y} - 1) & 65535",
+    0b000010: "({x} + {y}) & 65535",
+    0b010011: "({x} - {y}) & 65535",
+    0b000111: "({y} - {x}) & 65535",
+    0b000000: "{x} & {y}",
+    0b010101: "{x} | {y}"}
+# The shifts of ExtendAlu, by instruction bits 11 (left) and 10 (x):
+SHIFT_EXPRESSIONS = {
+    (False, False): "({y} >> 1) | ({y} & 32768)",
+    (False, True): "({x} >> 1) | ({x} & 32768)",
+    (True, False): "({y} << 1) & 65535",
+    (True, True): "({x} << 1) & 65535"}
+# Conditions on out for the jump bits (j1 j2 j3), besides 0 and JMP:
+JUMP_CONDITIONS = {
+    0b001: "0 < out < 32768",
+    0b010: "out == 0",
+    0b011: "out < 32768",
+    0b100: "out >= 32768",
+    0b101: "out != 0",
+    0b110: "out == 0 or out >= 32768"}
+UNCONDITIONAL_JUMP = 0b111
+
+
+class BlockCompiler:
+    """Runs the program of a CPUEmulator a basic block at a time. A block is
+    a straight run of instructions that ends with a jump; it is compiled, the
+    first time the program reaches it, into a Python function that executes
+    the whole block and returns the registers and the address of the next
+    block. Addresses that an A-Instruction of the block loaded are known when
+    the block is compiled, and are used as constants.
+
+    The compiled blocks are cached, and are dropped when a program is loaded
+    into the ROM of the emulator. If the compiler is given performance
+    counters, the blocks it compiles also update them.
+    """
+
+    def __init__(self, emulator: CPUEmulator,
+                 counters: typing.Optional[PerformanceCounters] = None) -> \
+            None:
+        """
+        Args:
+            emulator (CPUEmulator): the machine to run.
+            counters (typing.Optional[PerformanceCounters]): the counters to
+            update, if any.
+        """
+        self.emulator = emulator
+        self.counters = counters
+        self.__rom = None
+        self.__blocks = list()
+
+    def run(self, max_cycles: int,
+            breakpoints: typing.Optional[bytearray] = None) -> int:
+        """Executes instructions, starting from the current state of the
+        emulator. A block that would pass max_cycles is cut short, so exactly
+        max_cycles instructions are executed, unless the run reaches a
+        breakpoint.
+
+        Args:
+            max_cycles (int): the number of instructions to execute.
+            breakpoints (typing.Optional[bytearray]): if given, the run stops
+            at the first block (after the first one) whose address is nonzero
+            in this array of ROM_SIZE flags.
+
+        Returns:
+            int: the number of executed instructions.
+        """
+        emulator = self.emulator
+        blocks = self.blocks()
+        ram = emulator.ram
+        a, d, pc = emulator.a, emulator.d, emulator.pc
+        cycles = 0
+        while True:
+            block = blocks[pc]
+            if block is None:
+                block = blocks[pc] = self.compile_block(pc)
+            function, length = block
+            if cycles + length > max_cycles:
+                if cycles < max_cycles:  # run the rest of the cycles.
+                    function, length = self.compile_block(
+                        pc, max_cycles - cycles)
+                    a, d, pc = function(ram, a, d)
+                    cycles += length
+                break
+            a, d, pc = function(ram, a, d)
+            cycles += length
+            if breakpoints is not None and breakpoints[pc]:
+                break
+        emulator.a, emulator.d, emulator.pc = a, d, pc
+        emulator.cycles += cycles
+        return cycles
+
+    def blocks(self) -> typing.List[typing.Optional[typing.Tuple]]:
+        """
+        Returns:
+            typing.List[typing.Optional[typing.Tuple]]: the cache of compiled
+            blocks, indexed by the address of their first instruction: None,
+            or a block as returned by compile_block. The cache is replaced
+            when the emulator loads a program.
+        """
+        if self.emulator.rom is not self.__rom:  # a program was loaded.
+            self.__rom = self.emulator.rom
+            self.__blocks = [None] * ROM_SIZE
+        return self.__blocks
+
+    def compile_block(self, address: int,
+                      max_length: int = MAX_BLOCK_LENGTH) -> \
+            typing.Tuple[typing.Callable, int]:
+        """
+        Args:
+            address (int): the ROM address of the first instruction.
+            max_length (int): the maximal number of instructions in the
+            block.
+
+        Returns:
+            typing.Tuple[typing.Callable, int]: a function of the form
+            (ram, a, d) -> (a, d, pc) that executes the block, and the number
+            of instructions in the block. Only the last instruction of a
+            block can jump. Should be called after blocks().
+        """
+        source = ["def block(ram, a, d):"]
+        # The counts of the counters that are known at compile time:
+        static_counts = collections.Counter()
+        known_a = None  # the value of A, if the block loaded it.
+        length = 0
+        next_pc = address
+        while length < max_length and next_pc < ROM_SIZE:
+            instruction = self.__rom[next_pc]
+            length += 1
+            next_pc += 1
+            if not instruction & C_INSTRUCTION_BIT:
+                source.append("    a = {}".format(instruction))
+                known_a = instruction
+                continue
+            jump = instruction & UNCONDITIONAL_JUMP
+            source.extend(self._compile_c_instruction(
+                instruction, known_a, next_pc & ADDRESS_MASK, static_counts))
+            if instruction & STORE_A_BIT:
+                known_a = None
+            if jump:
+                break
+        else:
+            source.append("    return a, d, {}".format(
+                next_pc & ADDRESS_MASK))
+        namespace = {"compute": ALU.compute}
+        if self.counters is not None:
+            static_counts[CYCLES] += length
+            source[1:1] = ["    counters[{}] += {}".format(index, count)
+                           for index, count in sorted(static_counts.items())]
+            namespace.update({"counters": self.counters.values,
+                              "read_index": self.counters.read_index,
+                              "write_index": self.counters.write_index})
+        exec(compile("\n".join(source), "<block {}>".format(address),
+                     "exec"), namespace)
+        return namespace["block"], length
+
+    # HELP METHODS:
+
+    def _compile_c_instruction(self, instruction, known_a, next_pc,
+                               static_counts):
+        """Returns the source lines of a C-Instruction, given the value of A
+        if it is known and the address of the next instruction, and adds the
+        counts of the instruction that are known at compile time to
+        static_counts."""
+        if known_a is None:
+            address = "(a & {})".format(ADDRESS_MASK)
+        else:
+            address = str(known_a & ADDRESS_MASK)
+        y = "ram[{}]".format(address) if instruction & A_BIT else "a"
+        out = BlockCompiler._comp_expression(instruction).format(x="d", y=y)
+        jump = instruction & UNCONDITIONAL_JUMP
+        stores = [register for register, bit in
+                  [("m", STORE_M_BIT), ("a", STORE_A_BIT), ("d", STORE_D_BIT)]
+                  if instruction & bit]
+        lines = list()
+        taken, not_taken = "", ""
+        if self.counters is not None:
+            lines.extend(self._count_accesses(instruction, known_a, address,
+                                              static_counts))
+            if jump == UNCONDITIONAL_JUMP:
+                static_counts[JUMPS_TAKEN] += 1
+            elif jump:
+                taken = "counters[{}] += 1; ".format(JUMPS_TAKEN)
+                not_taken = "    counters[{}] += 1".format(JUMPS_NOT_TAKEN)
+        if jump:
+            # The jump target is A from before the instruction:
+            lines.append("    target = {}".format(address))
+        if len(stores) == 1 and not jump:
+            out_name = out
+        else:
+            lines.append("    out = " + out)
+            out_name = "out"
+        for register in stores:
+            if register != "m":
+                lines.append("    {} = {}".format(register, out_name))
+            elif known_a is None:
+                lines.append("    if {} < {}: ram[{}] = {}".format(
+                    address, KBD, address, out_name))
+            elif known_a & ADDRESS_MASK < KBD:
+                lines.append("    ram[{}] = {}".format(address, out_name))
+        if jump == UNCONDITIONAL_JUMP:
+            lines.append("    return a, d, target")
+        elif jump:
+            lines.append("    if {}: {}return a, d, target".format(
+                JUMP_CONDITIONS[jump], taken))
+            if not_taken:
+                lines.append(not_taken)
+            lines.append("    return a, d, {}".format(next_pc))
+        return lines
+
+    def _count_accesses(self, instruction, known_a, address, static_counts):
+        """Returns the source lines that count the memory accesses of a
+        C-Instruction whose address is not known at compile time, and adds
+        the other counts of the instruction to static_counts."""
+        lines = list()
+        accesses = [(self.counters.read_index, "read_index", A_BIT),
+                    (self.counters.write_index, "write_index", STORE_M_BIT)]
+        for index, index_name, bit in accesses:
+            if not instruction & bit:
+                continue
+            if known_a is None:
+                lines.append("    counters[{}[{}]] += 1".format(index_name,
+                                                               address))
+            else:
+                static_counts[index[known_a & ADDRESS_MASK]] += 1
+        if instruction & REGULAR_ALU_BITS != REGULAR_ALU_BITS:
+            static_counts[SHIFTS] += 1
+        return lines
+
+    @staticmethod
+    def _comp_expression(instruction):
+        """Returns the expression of the comp bits of a C-Instruction."""
+        if instruction & REGULAR_ALU_BITS != REGULAR_ALU_BITS:
+            return SHIFT_EXPRESSIONS[(bool(instruction & (1 << 11)),
+                                      bool(instruction & (1 << 10)))]
+        control_bits = (instruction >> 6) & 0b111111
+        if control_bits in ALU_EXPRESSIONS:
+            return ALU_EXPRESSIONS[control_bits]
+        return "compute({{x}}, {{y}}, {})".format(control_bits)
@@ -0,0 +1,293 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in  
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0 
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import array
+import mmap
+import os
+import sys
+import typing
+
+# The binary images of programs are read by the assembler's HackImage:
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), "Ex6"))
+from HackImage import HackImage
+
+ROM_SIZE = 32768
+RAM_SIZE = 32768
+SCREEN = 16384
+SCREEN_SIZE = 8192
+KBD = 24576
+WORD_MASK = 0xFFFF
+ADDRESS_MASK = 0x7FFF
+SIGN_BIT = 0x8000
+
+# The bits of a C-Instruction (see CPU.hdl and CpuMul.hdl):
+C_INSTRUCTION_BIT = 1 << 15
+REGULAR_ALU_BITS = (1 << 14) | (1 << 13)  # otherwise, a shift (ExtendAlu).
+A_BIT = 1 << 12
+STORE_A_BIT = 1 << 5
+STORE_D_BIT = 1 << 4
+STORE_M_BIT = 1 << 3
+JUMP_IF_NEGATIVE = 4
+JUMP_IF_ZERO = 2
+JUMP_IF_POSITIVE = 1
+# A C-Instruction that always jumps and stores nothing:
+HALT_JUMP_MASK = C_INSTRUCTION_BIT | STORE_A_BIT | STORE_D_BIT | \
+                 STORE_M_BIT | 0b111
+HALT_JUMP = C_INSTRUCTION_BIT | 0b111
+
+# Specialized ALU functions of (x, y) for the documented comp bits
+# (zx, nx, zy, ny, f, no); the other combinations use ALU.compute:
+ALU_FUNCTIONS = {
+    0b101010: lambda x, y: 0,
+    0b111111: lambda x, y: 1,
+    0b111010: lambda x, y: WORD_MASK,
+    0b001100: lambda x, y: x,
+    0b110000: lambda x, y: y,
+    0b001101: lambda x, y: x ^ WORD_MASK,
+    0b110001: lambda x, y: y ^ WORD_MASK,
+    0b001111: lambda x, y: -x & WORD_MASK,
+    0b110011: lambda x, y: -y & WORD_MASK,
+    0b011111: lambda x, y: (x + 1) & WORD_MASK,
+    0b110111: lambda x, y: (y + 1) & WORD_MASK,
+    0b001110: lambda x, y: (x - 1) & WORD_MASK,
+    0b110010: lambda x, y: (y - 1) & WORD_MASK,
+    0b000010: lambda x, y: (x + y) & WORD_MASK,
+    0b010011: lambda x, y: (x - y) & WORD_MASK,
+    0b000111: lambda x, y: (y - x) & WORD_MASK,
+    0b000000: lambda x, y: x & y,
+    0b010101: lambda x, y: x | y}
+
+# The shift functions of ExtendAlu, by instruction bits 11 (left) and 10 (x):
+SHIFT_FUNCTIONS = {
+    (False, False): lambda x, y: (y >> 1) | (y & SIGN_BIT),
+    (False, True): lambda x, y: (x >> 1) | (x & SIGN_BIT),
+    (True, False): lambda x, y: (y << 1) & WORD_MASK,
+    (True, True): lambda x, y: (x << 1) & WORD_MASK}
+
+
+class ALU:
+    """The Hack ALU (see ALU.hdl), on 16-bit unsigned words."""
+
+    @staticmethod
+    def compute(x: int, y: int, control_bits: int) -> int:
+        """
+        Args:
+            x (int): the first input.
+            y (int): the second input.
+            control_bits (int): zx, nx, zy, ny, f, no, from the most
+            significant bit to the least significant one.
+
+        Returns:
+            int: the output of the ALU.
+        """
+        if control_bits & 0b100000:  # zx
+            x = 0
+        if control_bits & 0b010000:  # nx
+            x ^= WORD_MASK
+        if control_bits & 0b001000:  # zy
+            y = 0
+        if control_bits & 0b000100:  # ny
+            y ^= WORD_MASK
+        if control_bits & 0b000010:  # f
+            out = (x + y) & WORD_MASK
+        else:
+            out = x & y
+        if control_bits & 0b000001:  # no
+            out ^= WORD_MASK
+        return out
+
+    @staticmethod
+    def function(instruction: int) -> typing.Callable[[int, int], int]:
+        """
+        Args:
+            instruction (int): a C-Instruction.
+
+        Returns:
+            typing.Callable[[int, int], int]: the function of (x, y) that the
+            ALU of CpuMul computes for the instruction, where x is D and y is
+            A or M.
+        """
+        if instruction & REGULAR_ALU_BITS != REGULAR_ALU_BITS:
+            return SHIFT_FUNCTIONS[(bool(instruction & (1 << 11)),
+                                    bool(instruction & (1 << 10)))]
+        control_bits = (instruction >> 6) & 0b111111
+        if control_bits in ALU_FUNCTIONS:
+            return ALU_FUNCTIONS[control_bits]
+        return lambda x, y: ALU.compute(x, y, control_bits)
+
+
+class CPUEmulator:
+    """Executes Hack programs with the semantics of CpuMul.hdl (the CPU of
+    CPU.hdl, extended with the shift instructions of ExtendAlu.hdl), with a
+    32K-word ROM and the memory map of Memory.hdl: RAM, the screen at SCREEN
+    and the keyboard at KBD. Every instruction of the ROM is decoded once,
+    when the program is loaded.
+
+    The state of the machine is public: the registers a, d and pc, the
+    number of executed cycles, and the rom and ram arrays of unsigned 16-bit
+    words (the ram is a memoryview of a file instead, after map_ram).
+    """
+
+    def __init__(self, program: typing.Sequence[int] = ()) -> None:
+        """Creates a machine with zeroed registers and memory, and loads the
+        program into its ROM.
+
+        Args:
+            program (typing.Sequence[int]): the words of the program.
+        """
+        self.ram = array.array("H", bytes(2 * RAM_SIZE))
+        self.a = 0
+        self.d = 0
+        self.pc = 0
+        self.cycles = 0
+        self.load(program)
+
+    def load(self, program: typing.Sequence[int]) -> None:
+        """Loads a program into the ROM (the rest of the ROM is zeroed) and
+        decodes it. Does not reset the registers or the RAM.
+
+        Args:
+            program (typing.Sequence[int]): the words of the program.
+        """
+        assert len(program) <= ROM_SIZE
+        self.rom = array.array("H", program)
+        self.rom.extend(bytes(2 * (ROM_SIZE - len(self.rom))))
+        decoded = dict()  # equal words share their decoded instruction.
+        for word in set(self.rom):
+            decoded[word] = CPUEmulator.decode(word)
+        self.__code = [decoded[word] for word in self.rom]
+
+    def reset(self) -> None:
+        """Resets the registers and the cycle counter (like the reset input of
+        the CPU), leaving the memory as is."""
+        self.a = 0
+        self.d = 0
+        self.pc = 0
+        self.cycles = 0
+
+    def map_ram(self, path: str) -> None:
+        """Backs the RAM with a file, that is mapped into memory: the RAM is
+        kept in the file as native 16-bit words, so other processes can map
+        it too and see the screen (from byte 2 * SCREEN) and set the key
+        (the word at byte 2 * KBD) while the program runs, without any
+        copying. The current content of the RAM is copied into the file.
+
+        Args:
+            path (str): the path of the file, which is created or resized if
+            needed.
+        """
+        with open(path, 'ab') as ram_file:
+            if ram_file.seek(0, 2) != 2 * RAM_SIZE:
+                ram_file.truncate(2 * RAM_SIZE)
+        with open(path, 'r+b') as ram_file:
+            self.__ram_map = mmap.mmap(ram_file.fileno(), 2 * RAM_SIZE)
+        ram = memoryview(self.__ram_map).cast("H")
+        ram[:] = self.ram
+        self.ram = ram
+
+    def set_key(self, key: int) -> None:
+        """Sets the code of the currently pressed key (0 for none).
+
+        Args:
+            key (int): the key code.
+        """
+        # Memory.hdl maps every address from KBD on to the keyboard:
+        self.ram[KBD:] = array.array("H", [key]) * (RAM_SIZE - KBD)
+
+    def run(self, max_cycles: int) -> int:
+        """Executes instructions, starting from the current state.
+
+        Args:
+            max_cycles (int): the number of instructions to execute.
+
+        Returns:
+            int: the number of executed instructions.
+        """
+        code = self.__code
+        ram = self.ram
+        a, d, pc = self.a, self.d, self.pc
+        for _ in range(max_cycles):
+            instruction = code[pc]
+            if instruction.__class__ is int:  # an A-Instruction.
+                a = instruction
+                pc = (pc + 1) & ADDRESS_MASK
+                continue
+            function, uses_m, store_a, store_d, store_m, jump = instruction
+            if uses_m:
+                out = function(d, ram[a & ADDRESS_MASK])
+            else:
+                out = function(d, a)
+            address = a
+            if store_m and a & ADDRESS_MASK < KBD:
+                ram[a & ADDRESS_MASK] = out
+            if store_a:
+                a = out
+            if store_d:
+                d = out
+            if jump and (jump & JUMP_IF_ZERO if out == 0 else
+                         jump & JUMP_IF_NEGATIVE if out & SIGN_BIT else
+                         jump & JUMP_IF_POSITIVE):
+                pc = address & ADDRESS_MASK
+            else:
+                pc = (pc + 1) & ADDRESS_MASK
+        self.a, self.d, self.pc = a, d, pc
+        self.cycles += max_cycles
+        return max_cycles
+
+    def halted(self) -> bool:
+        """
+        Returns:
+            bool: True if the program is in a halt loop, that is, at an
+            A-Instruction that loads its own address (like @END in (END))
+            or at the unconditional jump that follows it, if that jump stores
+            nothing. The state of the machine can never change after that.
+        """
+        for address in (self.pc, (self.pc - 1) & ADDRESS_MASK):
+            jump = self.rom[(address + 1) & ADDRESS_MASK]
+            if self.rom[address] == address and \
+                    jump & HALT_JUMP_MASK == HALT_JUMP and \
+                    (address == self.pc or self.a == address):
+                return True
+        return False
+
+    @staticmethod
+    def decode(instruction: int) -> typing.Union[int, typing.Tuple]:
+        """Decodes an instruction.
+
+        Args:
+            instruction (int): a 16-bit instruction.
+
+        Returns:
+            typing.Union[int, typing.Tuple]: the value of an A-Instruction,
+            or a tuple of the ALU function, whether it reads M, whether it
+            stores into A, D and M, and the jump bits of a C-Instruction.
+        """
+        if not instruction & C_INSTRUCTION_BIT:
+            return instruction
+        return (ALU.function(instruction), bool(instruction & A_BIT),
+                bool(instruction & STORE_A_BIT),
+                bool(instruction & STORE_D_BIT),
+                bool(instruction & STORE_M_BIT), instruction & 0b111)
+
+    @staticmethod
+    def read_program(path: str, byteorder: str = "little") -> \
+            typing.List[int]:
+        """Reads an assembled program: a .hack text file, or a binary image
+        written by the assembler (.hackbin, or .npy), which is memory-mapped
+        by HackImage.load_image.
+
+        Args:
+            path (str): the path of the program.
+            byteorder (str): the byte order of a .hackbin image.
+
+        Returns:
+            typing.List[int]: the words of the program.
+        """
+        if os.path.splitext(path)[1].lower() == ".hack":
+            with open(path, 'r') as program_file:
+                return [int(line, 2) for line in program_file if line.strip()]
+        return HackImage.load_image(path, byteorder).tolist()
@@ -0,0 +1,304 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in  
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0 
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import array
+import typing
+from CPUEmulator import CPUEmulator, ALU, ROM_SIZE, KBD, WORD_MASK, \
+    ADDRESS_MASK, SIGN_BIT, C_INSTRUCTION_BIT, REGULAR_ALU_BITS, A_BIT, \
+    STORE_A_BIT, STORE_D_BIT, STORE_M_BIT, JUMP_IF_NEGATIVE, JUMP_IF_ZERO, \
+    JUMP_IF_POSITIVE, ALU_FUNCTIONS
+from BlockCompiler import BlockCompiler
+from PerformanceCounters import PerformanceCounters, CYCLES, JUMPS_TAKEN, \
+    JUMPS_NOT_TAKEN, SHIFTS
+
+# A loop is looked for at a target of backward jumps after it was jumped to
+# this many times, and again after twice as many jumps whenever none is
+# found:
+DETECTION_THRESHOLD = 64
+MAX_LOOP_LENGTH = 4096  # the most instructions in one iteration of a loop.
+# The comp bits whose output is an affine function of x and y, modulo 2^16
+# (all of the documented ones but x&y and x|y):
+AFFINE_ALU_BITS = set(ALU_FUNCTIONS) - {0b000000, 0b010101}
+SHIFT_LEFT_BIT = 1 << 11
+UNCONDITIONAL_JUMP = 0b111
+# The most signs that the output of a jump is followed through, when looking
+# for the iteration where the loop takes another path:
+MAX_SIGN_CHANGES = 64
+
+
+class IdleDetector:
+    """Runs the program of a CPUEmulator with a BlockCompiler, and skips the
+    iterations of loops that cannot change the course of the program.
+
+    When the program keeps jumping back to the same address, two iterations
+    of the loop there are traced. If both took the same path through the same
+    addresses, every instruction on the path computes an affine function
+    (+, -, !, <<, constants), and the second iteration changed every
+    register and RAM word by the same amount as the first one, then every
+    following iteration keeps doing so. The first iteration that will take
+    another path is found from the outputs of its conditional jumps, and the
+    loop jumps right to it, with the skipped cycles (and the performance
+    counters of the skipped iterations) charged analytically. That includes
+    counting loops like the ones of Sys.wait.
+
+    A loop that changes nothing at all is a halt (like "(END) @END 0;JMP" or
+    the loop of Sys.halt), and the run stops there, unless the loop reads the
+    keyboard (like Keyboard.readCharHelper) and more key events are coming,
+    in which case the loop is skipped to the end of the run.
+    """
+
+    def __init__(self, emulator: CPUEmulator,
+                 counters: typing.Optional[PerformanceCounters] = None) -> \
+            None:
+        """
+        Args:
+            emulator (CPUEmulator): the machine to run.
+            counters (typing.Optional[PerformanceCounters]): performance
+            counters to update, if any.
+        """
+        self.compiler = BlockCompiler(emulator, counters)
+        self.halted = False
+        self.skipped_cycles = 0
+        self.__back_jumps = array.array("L", [0]) * ROM_SIZE
+        self.__thresholds = array.array("L", [DETECTION_THRESHOLD]) * \
+            ROM_SIZE
+
+    def run(self, max_cycles: int, more_keys: bool = False) -> int:
+        """Executes instructions, starting from the current state of the
+        emulator, until max_cycles instructions were executed or skipped, or
+        the program halted.
+
+        Args:
+            max_cycles (int): the number of instructions to execute.
+            more_keys (bool): whether the key will change at the end of the
+            run (by the next scripted key event), so a loop that waits for a
+            key is not a halt.
+
+        Returns:
+            int: the number of executed and skipped instructions.
+        """
+        emulator = self.compiler.emulator
+        blocks = self.compiler.blocks()
+        back_jumps, thresholds = self.__back_jumps, self.__thresholds
+        ram = emulator.ram
+        a, d, pc = emulator.a, emulator.d, emulator.pc
+        cycles = 0
+        self.halted = False
+        while True:
+            block = blocks[pc]
+            if block is None:
+                block = blocks[pc] = self.compiler.compile_block(pc)
+            function, length = block
+            if cycles + length > max_cycles:
+                break
+            start = pc
+            a, d, pc = function(ram, a, d)
+            cycles += length
+            if pc <= start:
+                back_jumps[pc] += 1
+                if back_jumps[pc] >= thresholds[pc]:
+                    head = pc
+                    emulator.a, emulator.d, emulator.pc = a, d, pc
+                    skipped, traced = self._skip_loop(max_cycles - cycles,
+                                                      more_keys)
+                    a, d, pc = emulator.a, emulator.d, emulator.pc
+                    cycles += traced + skipped
+                    if skipped or self.halted:
+                        thresholds[head] = back_jumps[head] + \
+                            DETECTION_THRESHOLD
+                    else:
+                        thresholds[head] *= 2
+                    if self.halted:
+                        break
+        emulator.a, emulator.d, emulator.pc = a, d, pc
+        emulator.cycles += cycles
+        if self.halted:
+            return cycles
+        return cycles + self.compiler.run(max_cycles - cycles)
+
+    # HELP METHODS:
+
+    def _skip_loop(self, max_cycles, more_keys):
+        """Traces two iterations of the loop at the current address and
+        skips the iterations after them that take the same path, or sets
+        halted. Returns the numbers of skipped and of traced cycles."""
+        emulator = self.compiler.emulator
+        counters = self.compiler.counters
+        head = emulator.pc
+        a0, d0 = emulator.a, emulator.d
+        first = self._trace_iteration(head, max_cycles)
+        traced = len(first[0])
+        if not first[5]:
+            return 0, traced
+        a1, d1 = emulator.a, emulator.d
+        counters_before = list(counters.values) if counters else None
+        second = self._trace_iteration(head, max_cycles - traced)
+        traced += len(second[0])
+        if not second[5] or first[:2] != second[:2] or \
+                not self._is_affine(first[0]):
+            return 0, traced
+        path, addresses, outs, old_values, reads_keyboard, closed = first
+        length = len(path)
+        # The change of every word in each iteration, and the one after it:
+        changes = {address: ((second[3][address] - value) & WORD_MASK,
+                             (emulator.ram[address] - second[3][address]) &
+                             WORD_MASK)
+                   for address, value in old_values.items()}
+        changes["a"] = ((a1 - a0) & WORD_MASK, (emulator.a - a1) & WORD_MASK)
+        changes["d"] = ((d1 - d0) & WORD_MASK, (emulator.d - d1) & WORD_MASK)
+        if any(change != next_change for change, next_change
+               in changes.values()):
+            return 0, traced
+        iterations = (max_cycles - traced) // length
+        for (out, jump), (next_out, next_jump) in zip(outs, second[2]):
+            iterations = IdleDetector._iterations_on_path(
+                out, (next_out - out) & WORD_MASK, jump, iterations)
+        if not any(change for change, next_change in changes.values()) and \
+                (not reads_keyboard or not more_keys):
+            self.halted = True
+            return 0, traced
+        for address, (change, next_change) in changes.items():
+            if address == "a":
+                emulator.a = (emulator.a + iterations * change) & WORD_MASK
+            elif address == "d":
+                emulator.d = (emulator.d + iterations * change) & WORD_MASK
+            else:
+                emulator.ram[address] = (emulator.ram[address] +
+                                         iterations * change) & WORD_MASK
+        if counters:
+            for i, value in enumerate(counters.values):
+                counters.values[i] += iterations * (value -
+                                                    counters_before[i])
+        self.skipped_cycles += iterations * length
+        return iterations * length, traced
+
+    def _trace_iteration(self, head, max_cycles):
+        """Executes instructions one at a time from the current address,
+        until the program returns to head, or MAX_LOOP_LENGTH or max_cycles
+        instructions were executed. Returns the addresses of the executed
+        instructions, the RAM addresses they accessed, pairs of the form
+        (output, jump bits) of the conditional jumps, the values of the
+        written RAM words before the iteration, whether the keyboard was
+        read, and whether the program returned to head. Updates the
+        performance counters, but not the number of cycles of the
+        emulator."""
+        emulator = self.compiler.emulator
+        counters = self.compiler.counters
+        rom, ram = emulator.rom, emulator.ram
+        a, d, pc = emulator.a, emulator.d, emulator.pc
+        path, addresses, outs, old_values = list(), list(), list(), dict()
+        reads_keyboard = False
+        for _ in range(min(MAX_LOOP_LENGTH, max_cycles)):
+            instruction = rom[pc]
+            path.append(pc)
+            if counters:
+                counters.values[CYCLES] += 1
+            if not instruction & C_INSTRUCTION_BIT:
+                a = instruction
+                pc = (pc + 1) & ADDRESS_MASK
+            else:
+                address = a & ADDRESS_MASK
+                if instruction & A_BIT:
+                    addresses.append(address)
+                    reads_keyboard = reads_keyboard or address >= KBD
+                    out = ALU.function(instruction)(d, ram[address])
+                else:
+                    out = ALU.function(instruction)(d, a)
+                if instruction & STORE_M_BIT:
+                    addresses.append(address)
+                    if address < KBD:
+                        old_values.setdefault(address, ram[address])
+                        ram[address] = out
+                if counters:
+                    IdleDetector._count(counters, instruction, address, out)
+                jump = instruction & UNCONDITIONAL_JUMP
+                if jump and jump != UNCONDITIONAL_JUMP:
+                    outs.append((out, jump))
+                if instruction & STORE_A_BIT:
+                    a = out
+                if instruction & STORE_D_BIT:
+                    d = out
+                if IdleDetector._jumps(out, jump):
+                    pc = address
+                else:
+                    pc = (pc + 1) & ADDRESS_MASK
+            if pc == head:
+                break
+        emulator.a, emulator.d, emulator.pc = a, d, pc
+        return path, addresses, outs, old_values, reads_keyboard, pc == head
+
+    def _is_affine(self, path):
+        """Does every instruction on the path compute an affine function?"""
+        rom = self.compiler.emulator.rom
+        for pc in path:
+            instruction = rom[pc]
+            if not instruction & C_INSTRUCTION_BIT:
+                continue
+            if instruction & REGULAR_ALU_BITS != REGULAR_ALU_BITS:
+                if not instruction & SHIFT_LEFT_BIT:
+                    return False
+            elif (instruction >> 6) & 0b111111 not in AFFINE_ALU_BITS:
+                return False
+        return True
+
+    @staticmethod
+    def _jumps(out, jump):
+        """Does a C-Instruction with the jump bits jump, given its output?"""
+        if out == 0:
+            return bool(jump & JUMP_IF_ZERO)
+        if out & SIGN_BIT:
+            return bool(jump & JUMP_IF_NEGATIVE)
+        return bool(jump & JUMP_IF_POSITIVE)
+
+    @staticmethod
+    def _iterations_on_path(out, change, jump, max_iterations):
+        """Given the output of a conditional jump in the first traced
+        iteration, and its change in every iteration, returns how many of
+        the iterations after the two traced ones (at most max_iterations)
+        make the same jump decision. The outputs are followed from one sign
+        (negative, zero or positive) to the next, which is where the
+        decision can change; if that takes too many steps, fewer iterations
+        are returned, which is always safe."""
+        if not change:
+            return max_iterations
+        decision = IdleDetector._jumps(out, jump)
+        step = change - (1 << 16) if change & SIGN_BIT else change
+        iteration = 2
+        for _ in range(MAX_SIGN_CHANGES):
+            if iteration - 2 >= max_iterations:
+                return max_iterations
+            value = (out + iteration * change) & WORD_MASK
+            if IdleDetector._jumps(value, jump) != decision:
+                return iteration - 2
+            # The value (from 0 to 0xFFFF) of the next sign, in the
+            # direction of the step:
+            if step > 0:
+                boundary = 1 if value == 0 else \
+                    SIGN_BIT if value < SIGN_BIT else 1 << 16
+                iteration += -(-(boundary - value) // step)
+            else:
+                boundary = -1 if value == 0 else \
+                    0 if value < SIGN_BIT else SIGN_BIT - 1
+                iteration += -(-(value - boundary) // -step)
+        return min(iteration - 2, max_iterations)
+
+    @staticmethod
+    def _count(counters, instruction, address, out):
+        """Updates the performance counters of an executed C-Instruction."""
+        values = counters.values
+        if instruction & A_BIT:
+            values[counters.read_index[address]] += 1
+        if instruction & STORE_M_BIT:
+            values[counters.write_index[address]] += 1
+        if instruction & REGULAR_ALU_BITS != REGULAR_ALU_BITS:
+            values[SHIFTS] += 1
+        jump = instruction & UNCONDITIONAL_JUMP
+        if jump == UNCONDITIONAL_JUMP:
+            values[JUMPS_TAKEN] += 1
+        elif IdleDetector._jumps(out, jump):
+            values[JUMPS_TAKEN] += 1
+        elif jump:
+            values[JUMPS_NOT_TAKEN] += 1
@@ -0,0 +1,103 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in  
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0 
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import array
+import mmap
+import struct
+import sys
+import typing
+from CPUEmulator import CPUEmulator, ROM_SIZE, RAM_SIZE
+from PerformanceCounters import PerformanceCounters
+
+STATE_MAGIC = b"\x93HACKSTATE\x01\x00"  # version 1.0.
+BYTEORDERS = {"little": b"<", "big": b">"}
+# The header, after the magic: the byte order of the file, the length of the
+# program, the number of counters, A, D, PC and the number of cycles:
+HEADER_FORMAT = "cxxxIIHHHxxQ"
+# The header is padded, so the RAM and the counters after it are aligned:
+HEADER_SIZE = 64
+
+
+class MachineState:
+    """Saves the whole state of a CPUEmulator (its ROM, RAM and registers,
+    the number of executed cycles, and performance counters) into a binary
+    file, and restores machines from such files. The file is a header, the
+    RAM as 16-bit words, the counters as 64-bit words and the program, all
+    in the byte order of the machine that saved them.
+
+    A restored machine gets a copy-on-write mapping of the RAM in the file,
+    so restoring does not read the RAM up front, and the file never changes:
+    a run that starts after a long boot (like the initialization of the OS
+    by Sys.init) can be saved once and restored by any number of runs.
+    """
+
+    @staticmethod
+    def save(emulator: CPUEmulator, output_file: typing.BinaryIO,
+             counters: typing.Optional[PerformanceCounters] = None) -> None:
+        """Writes the state of a machine.
+
+        Args:
+            emulator (CPUEmulator): the machine.
+            output_file (typing.BinaryIO): the state file.
+            counters (typing.Optional[PerformanceCounters]): counters to save
+            with the machine, if any.
+        """
+        program = emulator.rom.tobytes().rstrip(b"\0")
+        program_length = (len(program) + 1) // 2
+        values = counters.values if counters is not None else []
+        header = STATE_MAGIC + struct.pack(
+            BYTEORDERS[sys.byteorder].decode("ascii") + HEADER_FORMAT,
+            BYTEORDERS[sys.byteorder], program_length, len(values),
+            emulator.a, emulator.d, emulator.pc, emulator.cycles)
+        output_file.write(header.ljust(HEADER_SIZE, b"\0"))
+        output_file.write(emulator.ram.tobytes())
+        output_file.write(array.array("Q", values).tobytes())
+        output_file.write(emulator.rom[:program_length].tobytes())
+
+    @staticmethod
+    def restore(path: str,
+                counters: typing.Optional[PerformanceCounters] = None) -> \
+            CPUEmulator:
+        """Creates a machine in a saved state.
+
+        Args:
+            path (str): the path of a state file written by save.
+            counters (typing.Optional[PerformanceCounters]): if given, the
+            saved counters (if any) are copied into these counters.
+
+        Returns:
+            CPUEmulator: the machine.
+        """
+        with open(path, 'rb') as state_file:
+            state = mmap.mmap(state_file.fileno(), 0,
+                              access=mmap.ACCESS_COPY)
+        assert state[:len(STATE_MAGIC)] == STATE_MAGIC, \
+            "{} is not a machine state file".format(path)
+        byteorder = state[len(STATE_MAGIC):len(STATE_MAGIC) + 1]
+        program_length, counters_length, a, d, pc, cycles = struct.unpack_from(
+            byteorder.decode("ascii") + HEADER_FORMAT, state,
+            len(STATE_MAGIC))[1:]
+        assert program_length <= ROM_SIZE
+        ram = memoryview(state)[HEADER_SIZE:HEADER_SIZE + 2 * RAM_SIZE].cast(
+            "H")
+        values_start = HEADER_SIZE + 2 * RAM_SIZE
+        program_start = values_start + 8 * counters_length
+        values = array.array("Q", state[values_start:program_start])
+        program = array.array("H", state[program_start:program_start +
+                                         2 * program_length])
+        if byteorder != BYTEORDERS[sys.byteorder]:
+            ram = array.array("H", ram)
+            for words in (ram, values, program):
+                words.byteswap()
+        emulator = CPUEmulator(program)
+        emulator.ram = ram
+        emulator.a, emulator.d, emulator.pc = a, d, pc
+        emulator.cycles = cycles
+        if counters is not None and values:
+            assert len(values) == len(counters.values)
+            # The compiled blocks of a BlockCompiler hold the list itself:
+            counters.values[:] = values.tolist()
+        return emulator
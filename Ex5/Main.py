@@ -0,0 +1,355 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in  
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0 
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import argparse
+import os
+import signal
+import sys
+import typing
+from CPUEmulator import CPUEmulator, ROM_SIZE
+from BlockCompiler import BlockCompiler
+from IdleDetector import IdleDetector
+from MachineState import MachineState
+from PerformanceCounters import PerformanceCounters
+from Profiler import Profiler
+from ScreenSnapshot import ScreenSnapshot, IMAGE_FORMATS
+
+MAP_EXTENSION = ".map"  # see the --source-map option of the assembler.
+
+DEFAULT_MAX_CYCLES = 1000000
+
+
+def parse_assignment(assignment: str) -> typing.Tuple[int, int]:
+    """
+    Args:
+        assignment (str): a string of the form "ADDRESS=VALUE".
+
+    Returns:
+        typing.Tuple[int, int]: the address and the value, as an unsigned
+        16-bit word.
+    """
+    address, value = assignment.split("=")
+    return int(address, 0), int(value, 0) & 0xFFFF
+
+
+def parse_range(addresses: str) -> range:
+    """
+    Args:
+        addresses (str): a string of the form "ADDRESS" or "FIRST-LAST".
+
+    Returns:
+        range: the addresses.
+    """
+    first, _, last = addresses.partition("-")
+    return range(int(first, 0), int(last or first, 0) + 1)
+
+
+def read_returns(labels: typing.List[typing.Tuple[int, str]],
+                 prefixes: typing.List[str]) -> typing.Dict[int, str]:
+    """
+    Args:
+        labels (typing.List[typing.Tuple[int, str]]): the labels of a
+        program, as pairs of the form (address, label) (see
+        Profiler.read_source_map).
+        prefixes (typing.List[str]): prefixes of function names, like
+        "Screen." or "Output.printChar".
+
+    Returns:
+        typing.Dict[int, str]: the addresses that the calls to the matching
+        functions return to (their Xxx.yyy$ret.N labels), mapped to the names
+        of the functions.
+    """
+    returns = dict()
+    for address, label in labels:
+        function, found, _ = label.partition("$ret.")
+        if found and function.startswith(tuple(prefixes)):
+            returns[address] = function
+    return returns
+
+
+def run_program(program_path: str, max_cycles: int,
+                assignments: typing.List[typing.Tuple[int, int]],
+                key_events: typing.List[typing.Tuple[int, int]] = (),
+                byteorder: str = "little", jit: bool = False,
+                profile_file: typing.Optional[typing.TextIO] = None,
+                counters: typing.Optional[PerformanceCounters] = None,
+                idle: bool = False, device_path: typing.Optional[str] = None,
+                snapshots: typing.Optional[ScreenSnapshot] = None,
+                snapshot_cycles: typing.List[int] = (),
+                snapshot_calls: typing.List[str] = (),
+                state_path: typing.Optional[str] = None,
+                stop_at: typing.Optional[str] = None) \
+        -> typing.Tuple[CPUEmulator, bool]:
+    """Loads a program, sets the initial RAM and runs the program.
+
+    Args:
+        program_path (str): the path of a .hack, .hackbin or .npy file.
+        max_cycles (int): the number of instructions to execute.
+        assignments (typing.List[typing.Tuple[int, int]]): pairs of the form
+        (address, value) to write to the RAM before running.
+        key_events (typing.List[typing.Tuple[int, int]]): pairs of the form
+        (cycle, key code): the key that is pressed from every cycle on.
+        byteorder (str): the byte order of a .hackbin file.
+        jit (bool): whether to run compiled basic blocks (see BlockCompiler)
+        instead of interpreting one instruction at a time.
+        profile_file (typing.Optional[typing.TextIO]): if given, the run is
+        profiled (see Profiler) and the report is written to this file. The
+        program must have a source map, and its .asm file is used if it is
+        next to the program.
+        counters (typing.Optional[PerformanceCounters]): if given, the run is
+        compiled (like with jit) and updates these counters.
+        idle (bool): whether to skip idle loops and stop at halts (see
+        IdleDetector), which implies jit.
+        device_path (typing.Optional[str]): if given, the RAM (including the
+        screen and the keyboard) is mapped to this file (see
+        CPUEmulator.map_ram).
+        snapshots (typing.Optional[ScreenSnapshot]): if given, the screen is
+        written with it at the snapshot cycles, after the snapshot calls, and
+        at the end of the run.
+        snapshot_cycles (typing.List[int]): the cycles at which to take
+        snapshots.
+        snapshot_calls (typing.List[str]): prefixes of function names: a
+        snapshot is taken whenever a call to a matching function returns.
+        The program must have a source map, and the run is compiled (like
+        with jit). Cannot be used with profile_file or idle.
+        state_path (typing.Optional[str]): if given, the machine and the
+        counters are restored from this state file (see MachineState), and
+        the program is only used for its source map. Cycles are counted from
+        the reset of the machine, including the ones before the state was
+        saved.
+        stop_at (typing.Optional[str]): if given, the run stops when a jump
+        reaches the address of this label, like Main.main (this requires a
+        source map and a compiled run, as snapshot_calls does).
+
+    Returns:
+        typing.Tuple[CPUEmulator, bool]: the machine after the run, and
+        whether the program halted.
+    """
+    if state_path is not None:
+        emulator = MachineState.restore(state_path, counters)
+    else:
+        emulator = CPUEmulator(CPUEmulator.read_program(program_path,
+                                                        byteorder))
+    if device_path is not None:
+        emulator.map_ram(device_path)
+    for address, value in assignments:
+        emulator.ram[address] = value
+    breakpoints = None
+    returns, stop_address = dict(), None
+    if snapshots is not None and snapshot_calls or stop_at is not None:
+        assert profile_file is None and not idle
+        with open(program_path + MAP_EXTENSION, 'r') as map_file:
+            labels = Profiler.read_source_map(map_file)[1]
+        if snapshots is not None:
+            returns = read_returns(labels, snapshot_calls)
+        if stop_at is not None:
+            stop_address = dict((label, address) for address, label in
+                                labels)[stop_at]
+        breakpoints = bytearray(ROM_SIZE)
+        for address in list(returns) + [stop_address]:
+            if address is not None:
+                breakpoints[address] = 1
+    if profile_file is not None:
+        asm_path = os.path.splitext(program_path)[0] + ".asm"
+        with open(program_path + MAP_EXTENSION, 'r') as map_file:
+            if os.path.exists(asm_path):
+                with open(asm_path, 'r') as asm_file:
+                    runner = Profiler(emulator, map_file, asm_file, counters)
+            else:
+                runner = Profiler(emulator, map_file, counters=counters)
+    elif idle:
+        runner = IdleDetector(emulator, counters)
+    elif jit or counters is not None or breakpoints is not None:
+        runner = BlockCompiler(emulator, counters)
+    else:
+        runner = emulator
+    key_events = sorted(key_events)
+    snapshot_cycles = sorted(snapshot_cycles) if snapshots is not None else []
+    halted = False
+    while emulator.cycles < max_cycles and not halted:
+        while key_events and key_events[0][0] <= emulator.cycles:
+            emulator.set_key(key_events.pop(0)[1])
+        while snapshot_cycles and snapshot_cycles[0] <= emulator.cycles:
+            snapshots.take(emulator.ram,
+                           "cycle{}".format(snapshot_cycles.pop(0)))
+        end = max_cycles
+        if key_events:
+            end = min(end, key_events[0][0])
+        if snapshot_cycles:
+            end = min(end, snapshot_cycles[0])
+        if idle:
+            runner.run(end - emulator.cycles, bool(key_events))
+            halted = runner.halted
+        elif breakpoints is not None:
+            runner.run(end - emulator.cycles, breakpoints)
+            if emulator.pc in returns:
+                snapshots.take(emulator.ram, returns[emulator.pc])
+            if emulator.pc == stop_address:
+                break
+        else:
+            runner.run(end - emulator.cycles)
+    halted = halted or emulator.halted()
+    if snapshots is not None:
+        for cycle in snapshot_cycles:  # the screen of a halted run is final.
+            if cycle <= emulator.cycles or halted and cycle <= max_cycles:
+                snapshots.take(emulator.ram, "cycle{}".format(cycle))
+        snapshots.take(emulator.ram, "end")
+    if profile_file is not None:
+        runner.report(profile_file)
+    return emulator, halted
+
+
+if "__main__" == __name__:
+    # Runs the program and prints the requested RAM words, as signed numbers.
+    arguments_parser = argparse.ArgumentParser(
+        prog="CPUEmulator",
+        usage="CPUEmulator <program path> [--max-cycles N] "
+              "[--set ADDRESS=VALUE ...] "
+              "[--print ADDRESS[-LAST] ...] [--key CODE] "
+              "[--keys CYCLE=CODE ...] [--byteorder {little,big}] [--jit] "
+              "[--idle] [--profile] [--counters JSON_PATH] [--require-halt] "
+              "[--device PATH] [--snapshot-dir DIR] [--snapshot-format "
+              "{pbm,png}] [--snapshot-cycles CYCLE ...] [--snapshot-calls "
+              "PREFIX ...] [--restore-state PATH] [--stop-at LABEL] "
+              "[--save-state PATH]")
+    # The path comes first, since the options that take several values
+    # would take it as one of them:
+    arguments_parser.add_argument(
+        "program_path",
+        help="the program to run, before the options")
+    arguments_parser.add_argument(
+        "--max-cycles", type=int, default=DEFAULT_MAX_CYCLES, metavar="N",
+        help="the number of instructions to execute (the cycle budget)")
+    arguments_parser.add_argument(
+        "--set", type=parse_assignment, nargs="+", default=[],
+        metavar="ADDRESS=VALUE", help="initialize RAM words before the run")
+    arguments_parser.add_argument(
+        "--print", type=parse_range, nargs="+", default=[],
+        metavar="ADDRESS[-LAST]", help="RAM words to print after the run")
+    arguments_parser.add_argument(
+        "--key", type=int, default=0,
+        help="the code of the key that is pressed from the start of the run")
+    arguments_parser.add_argument(
+        "--keys", type=parse_assignment, nargs="+", default=[],
+        metavar="CYCLE=CODE",
+        help="scripted key events: the key that is pressed from the cycle on "
+             "(0 releases the keys)")
+    arguments_parser.add_argument(
+        "--byteorder", choices=["little", "big"], default="little",
+        help="the byte order of the words in a .hackbin program")
+    arguments_parser.add_argument(
+        "--jit", action="store_true",
+        help="compile every basic block of the program into a Python "
+             "function the first time it runs")
+    arguments_parser.add_argument(
+        "--idle", action="store_true",
+        help="(with --jit) skip the iterations of idle and counting loops, "
+             "and stop when the program halts")
+    arguments_parser.add_argument(
+        "--profile", action="store_true",
+        help="profile the run (with --jit) by function, by VM command and by "
+             "call, using the <program path>.map source map")
+    arguments_parser.add_argument(
+        "--counters", metavar="JSON_PATH",
+        help="count cycles, memory accesses by region, jumps and shifts "
+             "(with --jit), and write them to this file at exit, and whenever "
+             "the emulator receives SIGUSR1")
+    arguments_parser.add_argument(
+        "--require-halt", action="store_true",
+        help="(with --idle) fail if the program does not halt within the "
+             "cycle budget: the halt of a Jack program (the loop of Sys.halt) "
+             "is only detected by --idle")
+    arguments_parser.add_argument(
+        "--device", metavar="PATH",
+        help="map the RAM to this file, as native 16-bit words, so other "
+             "processes can read the screen (from byte 32768) and set the "
+             "key (at byte 49152) during the run")
+    arguments_parser.add_argument(
+        "--snapshot-dir", metavar="DIR",
+        help="write snapshots of the screen into this directory: at the "
+             "snapshot cycles, after the snapshot calls, and at the end of "
+             "the run")
+    arguments_parser.add_argument(
+        "--snapshot-format", choices=IMAGE_FORMATS, default="pbm",
+        help="the image format of the snapshots")
+    arguments_parser.add_argument(
+        "--snapshot-cycles", type=int, nargs="+", default=[], metavar="CYCLE",
+        help="the cycles at which to take snapshots")
+    arguments_parser.add_argument(
+        "--snapshot-calls", nargs="+", default=[], metavar="PREFIX",
+        help="take a snapshot whenever a call to a function whose name "
+             "starts with one of these prefixes (like Screen.) returns, using "
+             "the <program path>.map source map (with --jit)")
+    arguments_parser.add_argument(
+        "--restore-state", metavar="PATH",
+        help="start from a machine state saved with --save-state, instead of "
+             "loading the program (whose source map is still used)")
+    arguments_parser.add_argument(
+        "--stop-at", metavar="LABEL",
+        help="stop the run when a jump reaches this label, like Main.main, "
+             "using the <program path>.map source map (with --jit)")
+    arguments_parser.add_argument(
+        "--save-state", metavar="PATH",
+        help="save the machine state (with the counters) after the run")
+    arguments = arguments_parser.parse_args()
+    if arguments.idle and arguments.profile:
+        arguments_parser.error("--idle cannot be used with --profile")
+    if arguments.idle and arguments.device:
+        # The key can change at any time, so no loop that reads it is idle.
+        arguments_parser.error("--idle cannot be used with --device")
+    if arguments.require_halt and not arguments.idle:
+        arguments_parser.error("--require-halt requires --idle")
+    if (arguments.snapshot_cycles or arguments.snapshot_calls) and \
+            not arguments.snapshot_dir:
+        arguments_parser.error("snapshots require --snapshot-dir")
+    if (arguments.snapshot_calls or arguments.stop_at) and \
+            (arguments.idle or arguments.profile):
+        arguments_parser.error("--snapshot-calls and --stop-at cannot be "
+                               "used with --idle or --profile")
+    run_snapshots = None
+    if arguments.snapshot_dir:
+        run_snapshots = ScreenSnapshot(arguments.snapshot_dir,
+                                       arguments.snapshot_format)
+    run_counters = None
+    if arguments.counters:
+        run_counters = PerformanceCounters()
+
+        def write_counters(signal_number=None, frame=None):
+            """Writes the counters to the counters file."""
+            with open(arguments.counters, 'w') as counters_file:
+                run_counters.write_json(counters_file,
+                                        max_cycles=arguments.max_cycles)
+
+        signal.signal(signal.SIGUSR1, write_counters)
+    try:
+        machine, machine_halted = run_program(
+            os.path.abspath(arguments.program_path), arguments.max_cycles,
+            arguments.set, [(0, arguments.key)] + arguments.keys,
+            arguments.byteorder, arguments.jit,
+            sys.stdout if arguments.profile else None, run_counters,
+            arguments.idle, arguments.device, run_snapshots,
+            arguments.snapshot_cycles, arguments.snapshot_calls,
+            arguments.restore_state, arguments.stop_at)
+    except BaseException:  # write the counters of an interrupted run too.
+        if run_counters is not None:
+            write_counters()
+        raise
+    if run_counters is not None:
+        with open(arguments.counters, 'w') as counters_file:
+            run_counters.write_json(counters_file, machine_halted,
+                                    arguments.max_cycles)
+    if arguments.save_state:
+        with open(arguments.save_state, 'wb') as state_file:
+            MachineState.save(machine, state_file, run_counters)
+    for ram_range in arguments.print:
+        for ram_address in ram_range:
+            word = machine.ram[ram_address]
+            print("RAM[{}] = {}".format(ram_address,
+                                        word - 0x10000 if word & 0x8000
+                                        else word))
+    if arguments.require_halt and not machine_halted:
+        sys.exit("The program did not halt within {} cycles".format(
+            arguments.max_cycles))
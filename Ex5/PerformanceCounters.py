@@ -0,0 +1,74 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in  
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0 
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import json
+import typing
+from CPUEmulator import RAM_SIZE
+
+# The regions of the RAM, as laid out by the VM translator and the OS, in the
+# form (name, first address, end address):
+REGIONS = [("registers", 0, 16), ("static", 16, 256), ("stack", 256, 2048),
+           ("heap", 2048, 16384), ("screen", 16384, 24576),
+           ("keyboard", 24576, RAM_SIZE)]
+# The indexes of the counters in PerformanceCounters.values:
+CYCLES = 0
+JUMPS_TAKEN = 1
+JUMPS_NOT_TAKEN = 2
+SHIFTS = 3
+READS = 4  # the first of the read counters, one per region.
+WRITES = READS + len(REGIONS)  # the first of the write counters.
+COUNTER_NAMES = ["cycles", "jumps_taken", "jumps_not_taken", "shifts"] + \
+                ["reads_" + name for name, first, end in REGIONS] + \
+                ["writes_" + name for name, first, end in REGIONS]
+
+
+class PerformanceCounters:
+    """Hardware-like performance counters of an emulated run: executed
+    cycles, RAM reads and writes by region, conditional jumps taken and not
+    taken (an unconditional jump counts as taken) and shift instructions.
+
+    The counters are a flat list of integers, that the blocks compiled by a
+    BlockCompiler created with these counters update as they run. Accesses
+    to addresses that are known when a block is compiled are added once per
+    block, and the others are classified through the read_index and
+    write_index tables, which map every RAM address to its counter.
+    """
+
+    def __init__(self) -> None:
+        """Creates zeroed counters."""
+        self.values = [0] * len(COUNTER_NAMES)
+        self.read_index = bytearray(RAM_SIZE)
+        self.write_index = bytearray(RAM_SIZE)
+        for i, (name, first, end) in enumerate(REGIONS):
+            self.read_index[first:end] = bytes([READS + i]) * (end - first)
+            self.write_index[first:end] = bytes([WRITES + i]) * (end - first)
+
+    def as_dict(self) -> typing.Dict[str, int]:
+        """
+        Returns:
+            typing.Dict[str, int]: the counters, by name.
+        """
+        return dict(zip(COUNTER_NAMES, self.values))
+
+    def write_json(self, output_file: typing.TextIO,
+                   halted: typing.Optional[bool] = None,
+                   max_cycles: typing.Optional[int] = None) -> None:
+        """Writes the counters as a JSON object.
+
+        Args:
+            output_file (typing.TextIO): the file to write to.
+            halted (typing.Optional[bool]): if given, whether the program
+            halted is written too.
+            max_cycles (typing.Optional[int]): if given, the cycle budget of
+            the run is written too.
+        """
+        report = {"counters": self.as_dict()}
+        if halted is not None:
+            report["halted"] = halted
+        if max_cycles is not None:
+            report["max_cycles"] = max_cycles
+        json.dump(report, output_file, indent=2)
+        output_file.write("\n")
@@ -0,0 +1,308 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in  
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0 
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import array
+import bisect
+import collections
+import typing
+from CPUEmulator import CPUEmulator, ROM_SIZE, ADDRESS_MASK, \
+    C_INSTRUCTION_BIT
+from BlockCompiler import BlockCompiler, UNCONDITIONAL_JUMP
+from PerformanceCounters import PerformanceCounters
+
+ANNOTATION = "// vm: "  # see the --annotate option of the VM translator.
+FUSED_SEPARATOR = "; "  # between the commands of a fused VM command.
+BOOTSTRAP = "(bootstrap)"
+REPORTED_BRANCHES = 20  # the number of conditional jumps in the report.
+
+
+class Profiler:
+    """Profiles the program of a CPUEmulator while running it with a
+    BlockCompiler. Since only the last instruction of a block can jump, it is
+    enough to count how many times every block is entered, and whether its
+    last instruction jumped (a jump to the next address is counted as not
+    taken), so the overhead is a few operations per block rather than per
+    instruction.
+
+    The counts are joined with the source map that the assembler writes with
+    --source-map: a function owns the addresses from its (Xxx.yyy) label up to
+    the next function, a block that ends right before a return label
+    (Xxx.yyy$ret.N) is a call of Xxx.yyy (also when it jumps to a routine
+    that the calls share), and any other jump to a return label is a return.
+    If the assembly was translated with --annotate, the addresses are also
+    mapped to the VM commands that generated them.
+    """
+
+    def __init__(self, emulator: CPUEmulator, map_file: typing.TextIO,
+                 asm_file: typing.Optional[typing.TextIO] = None,
+                 counters: typing.Optional[PerformanceCounters] = None) -> \
+            None:
+        """
+        Args:
+            emulator (CPUEmulator): the machine to run and profile.
+            map_file (typing.TextIO): the source map of its program.
+            asm_file (typing.Optional[typing.TextIO]): the assembly file that
+            the program was assembled from, if its VM commands should be
+            profiled.
+            counters (typing.Optional[PerformanceCounters]): performance
+            counters to update too, if any.
+        """
+        self.compiler = BlockCompiler(emulator, counters)
+        self.block_entries = array.array("Q", bytes(8 * ROM_SIZE))
+        self.taken_jumps = array.array("Q", bytes(8 * ROM_SIZE))
+        self.calls = collections.Counter()  # (caller, callee) -> calls.
+        self.call_cycles = collections.Counter()  # (caller, callee) -> cycles.
+        self.__stack = list()  # pairs of the form (function, cycle of call).
+        line_numbers, labels = Profiler.read_source_map(map_file)
+        self.__functions = [(address, label) for address, label in labels
+                            if "$" not in label and "." in label]
+        self.__function_addresses = [address for address, function in
+                                     self.__functions]
+        # The return labels, that follow the jumps of the calls:
+        self.__return_addresses = bytearray(ROM_SIZE + 1)
+        self.__callees = dict()  # return address -> the called function.
+        for address, label in labels:
+            if "$ret." in label:
+                self.__return_addresses[address] = 1
+                self.__callees[address] = label.split("$ret.")[0]
+        self.__active_calls = collections.Counter()  # function -> frames.
+        self.__commands = list()  # the VM command of every address.
+        if asm_file is not None:
+            annotations = Profiler._read_annotations(asm_file)
+            self.__commands = [annotations.get(line_number, "")
+                               for line_number in line_numbers]
+
+    def run(self, max_cycles: int) -> int:
+        """Executes instructions like BlockCompiler.run, and profiles them.
+        The last instructions, that do not fill a whole block, are executed
+        (and counted by the performance counters) but not profiled.
+
+        Args:
+            max_cycles (int): the number of instructions to execute.
+
+        Returns:
+            int: the number of executed instructions.
+        """
+        emulator = self.compiler.emulator
+        blocks = self.compiler.blocks()
+        block_entries, taken_jumps = self.block_entries, self.taken_jumps
+        return_addresses = self.__return_addresses
+        ram = emulator.ram
+        a, d, pc = emulator.a, emulator.d, emulator.pc
+        cycles = 0
+        while True:
+            block = blocks[pc]
+            if block is None:
+                block = blocks[pc] = self.compiler.compile_block(pc)
+            function, length = block
+            if cycles + length > max_cycles:
+                break
+            block_entries[pc] += 1
+            end = pc + length
+            a, d, pc = function(ram, a, d)
+            cycles += length
+            if pc != end & ADDRESS_MASK:
+                taken_jumps[end - 1] += 1
+            if return_addresses[end]:
+                self._call(self.__callees[end], emulator.cycles + cycles)
+            elif return_addresses[pc]:
+                self._return(emulator.cycles + cycles)
+        emulator.a, emulator.d, emulator.pc = a, d, pc
+        emulator.cycles += cycles
+        return cycles + self.compiler.run(max_cycles - cycles)
+
+    def hits(self) -> array.array:
+        """
+        Returns:
+            array.array: the number of times the instruction in every ROM
+            address was executed.
+        """
+        hits = array.array("Q", bytes(8 * ROM_SIZE))
+        blocks = self.compiler.blocks()
+        for address, entries in enumerate(self.block_entries):
+            if entries:
+                for i in range(address, address + blocks[address][1]):
+                    hits[i & ADDRESS_MASK] += entries
+        return hits
+
+    def function_profile(self) -> typing.List[typing.Tuple[str, int, int]]:
+        """
+        Returns:
+            typing.List[typing.Tuple[str, int, int]]: triplets of the form
+            (function, cycles spent in its own code, calls), the most
+            expensive first.
+        """
+        cycles = collections.Counter()
+        for address, hits in enumerate(self.hits()):
+            if hits:
+                cycles[self.function(address)] += hits
+        calls = collections.Counter()
+        for (caller, callee), count in self.calls.items():
+            calls[callee] += count
+        return [(function, function_cycles, calls[function])
+                for function, function_cycles in cycles.most_common()]
+
+    def command_profile(self) -> typing.List[typing.Tuple[str, int]]:
+        """
+        Returns:
+            typing.List[typing.Tuple[str, int]]: pairs of the form
+            (VM command, cycles spent in its translations), where the command
+            is its name and segment (for example "push local" or "call"), the
+            most expensive first. Empty if the program was not annotated.
+        """
+        cycles = collections.Counter()
+        if self.__commands:
+            for address, hits in enumerate(self.hits()):
+                if hits and address < len(self.__commands):
+                    cycles[Profiler._command_kind(
+                        self.__commands[address])] += hits
+        return cycles.most_common()
+
+    def branch_profile(self) -> typing.List[typing.Tuple[int, int, int]]:
+        """
+        Returns:
+            typing.List[typing.Tuple[int, int, int]]: triplets of the form
+            (ROM address, executions, taken jumps) of the conditional jumps
+            that were executed, the most executed first.
+        """
+        rom = self.compiler.emulator.rom
+        hits = self.hits()
+        branches = [(address, hits[address], self.taken_jumps[address])
+                    for address in range(ROM_SIZE) if hits[address] and
+                    rom[address] & C_INSTRUCTION_BIT and
+                    0 < rom[address] & UNCONDITIONAL_JUMP <
+                    UNCONDITIONAL_JUMP]
+        return sorted(branches, key=lambda branch: -branch[1])
+
+    def call_graph(self) -> typing.List[typing.Tuple[str, str, int, int]]:
+        """
+        Returns:
+            typing.List[typing.Tuple[str, str, int, int]]: tuples of the form
+            (caller, callee, calls, cycles), where cycles is the total time
+            from the calls to their returns (including nested calls), the most
+            expensive first.
+        """
+        return sorted([(caller, callee, count,
+                        self.call_cycles[(caller, callee)])
+                       for (caller, callee), count in self.calls.items()],
+                      key=lambda edge: (-edge[3], -edge[2]))
+
+    def function(self, address: int) -> str:
+        """
+        Args:
+            address (int): a ROM address.
+
+        Returns:
+            str: the function whose code is in the address.
+        """
+        i = bisect.bisect_right(self.__function_addresses, address)
+        if i == 0:
+            return BOOTSTRAP
+        return self.__functions[i - 1][1]
+
+    def report(self, output_file: typing.TextIO) -> None:
+        """Writes the flat profiles and the call graph.
+
+        Args:
+            output_file (typing.TextIO): the file to write to.
+        """
+        total = sum(self.hits()) or 1
+        output_file.write("Flat profile by function ({} profiled cycles):\n"
+                          "{:>7} {:>12} {:>10}  function\n".format(
+                              total, "%", "cycles", "calls"))
+        for function, cycles, calls in self.function_profile():
+            output_file.write("{:>7.2f} {:>12} {:>10}  {}\n".format(
+                100 * cycles / total, cycles, calls, function))
+        if self.__commands:
+            output_file.write("\nFlat profile by VM command:\n"
+                              "{:>7} {:>12}  command\n".format("%", "cycles"))
+            for command, cycles in self.command_profile():
+                output_file.write("{:>7.2f} {:>12}  {}\n".format(
+                    100 * cycles / total, cycles, command))
+        output_file.write("\nHottest conditional jumps:\n{:>12} {:>12} "
+                          "{:>7} {:>7}  function\n".format(
+                              "executions", "taken", "% taken", "address"))
+        for address, executions, taken in \
+                self.branch_profile()[:REPORTED_BRANCHES]:
+            command = self.__commands[address] \
+                if address < len(self.__commands) else ""
+            output_file.write("{:>12} {:>12} {:>7.2f} {:>7}  {}{}\n".format(
+                executions, taken, 100 * taken / executions, address,
+                self.function(address),
+                " ({})".format(command) if command else ""))
+        output_file.write("\nCall graph:\n{:>10} {:>12}  caller -> callee\n"
+                          .format("calls", "cycles"))
+        for caller, callee, calls, cycles in self.call_graph():
+            output_file.write("{:>10} {:>12}  {} -> {}\n".format(
+                calls, cycles, caller, callee))
+
+    @staticmethod
+    def read_source_map(map_file: typing.TextIO) -> \
+            typing.Tuple[typing.List[int],
+                         typing.List[typing.Tuple[int, str]]]:
+        """
+        Args:
+            map_file (typing.TextIO): a source map written by the assembler.
+
+        Returns:
+            typing.Tuple[typing.List[int],
+            typing.List[typing.Tuple[int, str]]]: the line number of every
+            address, and pairs of the form (address, label).
+        """
+        line_numbers, labels = list(), list()
+        for line in map_file:
+            line = line.rstrip()
+            if line.startswith("("):
+                labels.append((len(line_numbers), line[1:-1]))
+            elif line and not line.startswith("/"):
+                line_numbers.append(int(line))
+        return line_numbers, labels
+
+    # HELP METHODS:
+
+    def _call(self, callee, cycles):
+        """Records a call: a jump that is followed by a return label."""
+        caller = self.__stack[-1][0] if self.__stack else BOOTSTRAP
+        self.calls[(caller, callee)] += 1
+        self.__stack.append((callee, cycles))
+        self.__active_calls[callee] += 1
+
+    def _return(self, cycles):
+        """Records a return: a jump to a return label. Like gprof, the time
+        of a recursive call is counted only in its outermost frame."""
+        if not self.__stack:
+            return
+        callee, call_cycles = self.__stack.pop()
+        self.__active_calls[callee] -= 1
+        if not self.__active_calls[callee]:
+            caller = self.__stack[-1][0] if self.__stack else BOOTSTRAP
+            self.call_cycles[(caller, callee)] += cycles - call_cycles
+
+    @staticmethod
+    def _read_annotations(asm_file):
+        """Returns a dictionary of the form line number->VM command, for
+        every line of an annotated assembly file."""
+        annotations = dict()
+        command = ""
+        for line_number, line in enumerate(asm_file, 1):
+            line = line.strip()
+            if line.startswith(ANNOTATION):
+                command = line[len(ANNOTATION):]
+            annotations[line_number] = command
+        return annotations
+
+    @staticmethod
+    def _command_kind(command):
+        """Returns the name of a VM command, and its segment if it has one
+        (for every command of a fused command of the VM optimizer)."""
+        kinds = list()
+        for part in command.split(FUSED_SEPARATOR):
+            words = part.split()
+            if words and words[0] in ("push", "pop"):
+                kinds.append(" ".join(words[:2]))
+            elif words:
+                kinds.append(words[0])
+        return FUSED_SEPARATOR.join(kinds) if kinds else "(unknown)"
@@ -0,0 +1,143 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in  
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0 
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import array
+import os
+import struct
+import sys
+import typing
+import zlib
+from CPUEmulator import SCREEN, SCREEN_SIZE
+
+try:
+    import numpy
+except ImportError:  # numpy is optional, and only needed for bitmap.
+    numpy = None
+
+SCREEN_WIDTH = 512
+SCREEN_HEIGHT = 256
+IMAGE_FORMATS = ("pbm", "png")
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# A word of the screen keeps its leftmost pixel in its least significant bit,
+# and PBM and PNG rows keep it in the most significant bit of a byte:
+REVERSED_BITS = bytes(int("{:08b}".format(byte)[::-1], 2)
+                      for byte in range(256))
+# A 1-bit grayscale PNG stores black as 0, and PBM stores black as 1:
+INVERTED_BITS = bytes(0xFF - byte for byte in range(256))
+
+
+class ScreenSnapshot:
+    """Writes snapshots of the screen of a CPUEmulator as 512x256 images:
+    PBM (P4, the raw bitmap format of netpbm) or 1-bit grayscale PNG. The
+    words of the screen are converted a whole screen at a time (numpy
+    unpacks their bits, and bytes.translate reorders them otherwise), never
+    a pixel at a time, so a snapshot takes well under a millisecond.
+
+    The snapshots are numbered, in the order in which they are taken, and
+    written into a directory.
+    """
+
+    def __init__(self, directory: str, image_format: str = "pbm") -> None:
+        """
+        Args:
+            directory (str): the directory of the snapshots, which is created
+            if needed.
+            image_format (str): "pbm" or "png".
+        """
+        assert image_format in IMAGE_FORMATS
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.image_format = image_format
+        self.count = 0
+
+    def take(self, ram: typing.Sequence[int], name: str) -> str:
+        """Writes a snapshot of the screen.
+
+        Args:
+            ram (typing.Sequence[int]): the RAM of the machine.
+            name (str): a name for the snapshot, that is added to its number
+            in the name of its file.
+
+        Returns:
+            str: the path of the snapshot.
+        """
+        path = os.path.join(self.directory, "{:06d}-{}.{}".format(
+            self.count, name, self.image_format))
+        with open(path, 'wb') as output_file:
+            ScreenSnapshot.write(ram, output_file, self.image_format)
+        self.count += 1
+        return path
+
+    @staticmethod
+    def bitmap(ram: typing.Sequence[int]) -> "numpy.ndarray":
+        """
+        Args:
+            ram (typing.Sequence[int]): the RAM of the machine (an array or a
+            memoryview of unsigned 16-bit words, see CPUEmulator).
+
+        Returns:
+            numpy.ndarray: the pixels of the screen, as a
+            SCREEN_HEIGHT x SCREEN_WIDTH array of bytes: 1 for black and 0 for
+            white. Requires numpy.
+        """
+        words = numpy.frombuffer(ram, numpy.uint16, SCREEN_SIZE, 2 * SCREEN)
+        return numpy.unpackbits(words.astype("<u2").view(numpy.uint8),
+                                bitorder="little").reshape(SCREEN_HEIGHT,
+                                                           SCREEN_WIDTH)
+
+    @staticmethod
+    def rows(ram: typing.Sequence[int]) -> bytes:
+        """
+        Args:
+            ram (typing.Sequence[int]): the RAM of the machine.
+
+        Returns:
+            bytes: the rows of the screen, from the top, with 8 pixels in
+            every byte, from its most significant bit, and 1 for black.
+        """
+        if numpy is not None:
+            return numpy.packbits(ScreenSnapshot.bitmap(ram)).tobytes()
+        words = array.array("H", ram[SCREEN:SCREEN + SCREEN_SIZE])
+        if sys.byteorder != "little":
+            words.byteswap()
+        return words.tobytes().translate(REVERSED_BITS)
+
+    @staticmethod
+    def write(ram: typing.Sequence[int], output_file: typing.BinaryIO,
+              image_format: str = "pbm") -> None:
+        """Writes the screen as an image.
+
+        Args:
+            ram (typing.Sequence[int]): the RAM of the machine.
+            output_file (typing.BinaryIO): the image file.
+            image_format (str): "pbm" or "png".
+        """
+        assert image_format in IMAGE_FORMATS
+        rows = ScreenSnapshot.rows(ram)
+        if image_format == "pbm":
+            output_file.write("P4\n{} {}\n".format(
+                SCREEN_WIDTH, SCREEN_HEIGHT).encode("ascii"))
+            output_file.write(rows)
+            return
+        row_length = SCREEN_WIDTH // 8
+        rows = rows.translate(INVERTED_BITS)
+        # Every row starts with its filter type, 0 (none):
+        scanlines = b"".join(b"\0" + rows[start:start + row_length]
+                             for start in range(0, len(rows), row_length))
+        output_file.write(PNG_SIGNATURE)
+        output_file.write(ScreenSnapshot._png_chunk(b"IHDR", struct.pack(
+            ">IIBBBBB", SCREEN_WIDTH, SCREEN_HEIGHT, 1, 0, 0, 0, 0)))
+        output_file.write(ScreenSnapshot._png_chunk(b"IDAT",
+                                                    zlib.compress(scanlines)))
+        output_file.write(ScreenSnapshot._png_chunk(b"IEND", b""))
+
+    # HELP METHODS:
+
+    @staticmethod
+    def _png_chunk(chunk_type, data):
+        """Returns a PNG chunk of the given type and data."""
+        return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(
+            ">I", zlib.crc32(chunk_type + data))
@@ -0,0 +1,232 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in  
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0 
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import argparse
+import concurrent.futures
+import json
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+import typing
+from Main import assemble_file, TWO_PASS, SINGLE_PASS, STREAMING, BATCH
+
+DEFAULT_SIZES = [10000, 100000, 1000000]
+DEFAULT_MODES = [TWO_PASS, SINGLE_PASS, STREAMING, BATCH]
+C_COMMANDS = ["D=M", "M=D", "D=A", "A=M", "AM=M-1", "M=M+1", "D=D+M",
+              "D=D-M", "M=D|M", "M=D&M", "M=-M", "M=!M", "A=A-1", "D;JEQ",
+              "D;JGT", "D;JLT", "D;JNE", "0;JMP", "MD=M+1", "D=D+1"]
+SHIFT_COMMANDS = ["M=M<<", "M=M>>", "D=D<<", "D=D>>", "A=A<<", "A=A>>"]
+# The metrics that get worse when they grow, and those that get worse when
+# they shrink:
+LOWER_IS_BETTER = ["peak_rss_kib", "tracemalloc_peak_kib"]
+HIGHER_IS_BETTER = ["lines_per_second"]
+
+
+def generate_program(output_file: typing.TextIO, lines: int,
+                     label_density: float, variables: int,
+                     shift_ratio: float, seed: int = 0) -> None:
+    """Writes a synthetic assembly program. About half of the lines are
+    A-Commands, that refer to labels (backward and forward), to variables or
+    to numbers, and the others are C-Commands and label declarations.
+
+    Args:
+        output_file (typing.TextIO): the file to write to.
+        lines (int): the number of lines to write.
+        label_density (float): the fraction of lines that declare a label.
+        variables (int): the number of distinct variables.
+        shift_ratio (float): the fraction of C-Commands that are shifts.
+        seed (int): the seed of the random generator, so the same arguments
+        always generate the same program.
+    """
+    generator = random.Random(seed)
+    labels = max(1, int(lines * label_density))
+    next_label = 0
+    for _ in range(lines):
+        choice = generator.random()
+        if choice < label_density and next_label < labels:
+            output_file.write("(LABEL{})\n".format(next_label))
+            next_label += 1
+        elif choice < 0.5:
+            kind = generator.random()
+            if kind < 0.4:
+                output_file.write("@LABEL{}\n".format(
+                    generator.randrange(labels)))
+            elif kind < 0.7 and variables:
+                output_file.write("@var{}\n".format(
+                    generator.randrange(variables)))
+            else:
+                output_file.write("@{}\n".format(generator.randrange(32768)))
+        elif generator.random() < shift_ratio:
+            output_file.write(generator.choice(SHIFT_COMMANDS) + "\n")
+        else:
+            output_file.write(generator.choice(C_COMMANDS) + "\n")
+    for label in range(next_label, labels):  # declare the missing labels.
+        output_file.write("(LABEL{})\n".format(label))
+
+
+def measure(input_path: str, mode: str) -> typing.Dict[str, float]:
+    """Assembles the file twice: once to measure the time and the peak RSS,
+    and once to measure the peak of the memory traced by tracemalloc (which
+    slows the assembly down). Should run in a fresh process, so the peak RSS
+    belongs to this measurement only.
+
+    Args:
+        input_path (str): the path of the file to assemble.
+        mode (str): the assembly mode, as in Main.assemble_file.
+
+    Returns:
+        typing.Dict[str, float]: the measured metrics.
+    """
+    with open(input_path, 'r') as input_file:
+        lines = sum(1 for line in input_file)
+    with tempfile.TemporaryFile('w') as output_file:
+        with open(input_path, 'r') as input_file:
+            start = time.perf_counter()
+            assemble_file(input_file, output_file, mode)
+            seconds = time.perf_counter() - start
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        output_file.seek(0)
+        output_file.truncate()
+        with open(input_path, 'r') as input_file:
+            tracemalloc.start()
+            assemble_file(input_file, output_file, mode)
+            traced_peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+    return {"seconds": seconds, "lines_per_second": lines / seconds,
+            "peak_rss_kib": peak_rss, "tracemalloc_peak_kib":
+                traced_peak // 1024}
+
+
+def run_benchmarks(sizes: typing.List[int], modes: typing.List[str],
+                   label_density: float, variables: int,
+                   shift_ratio: float) -> typing.List[typing.Dict]:
+    """Generates a program of every size, and measures the assembly of each
+    one in every mode, each measurement in a fresh process.
+
+    Args:
+        sizes (typing.List[int]): the numbers of lines of the programs.
+        modes (typing.List[str]): the assembly modes to measure.
+        label_density (float): as in generate_program.
+        variables (int): as in generate_program.
+        shift_ratio (float): as in generate_program.
+
+    Returns:
+        typing.List[typing.Dict]: a result for every size and mode.
+    """
+    results = list()
+    spawn = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            input_path = os.path.join(directory, "{}.asm".format(size))
+            with open(input_path, 'w') as input_file:
+                generate_program(input_file, size, label_density, variables,
+                                 shift_ratio)
+            for mode in modes:
+                with concurrent.futures.ProcessPoolExecutor(
+                        1, mp_context=spawn) as executor:
+                    result = executor.submit(measure, input_path,
+                                             mode).result()
+                result.update({"lines": size, "mode": mode})
+                print("{:>9} lines {:>12}: {:>12.0f} lines/s, peak RSS "
+                      "{:>8} KiB, traced peak {:>8} KiB".format(
+                          size, mode, result["lines_per_second"],
+                          result["peak_rss_kib"],
+                          result["tracemalloc_peak_kib"]))
+                results.append(result)
+    return results
+
+
+def find_regressions(results: typing.List[typing.Dict],
+                     baseline: typing.List[typing.Dict],
+                     threshold: float) -> typing.List[str]:
+    """Compares results to the results of a previous run.
+
+    Args:
+        results (typing.List[typing.Dict]): the results of this run.
+        baseline (typing.List[typing.Dict]): the results of a previous run.
+        Results of sizes or modes that were not measured in both runs are
+        ignored.
+        threshold (float): the allowed relative change, for example 0.1 for
+        10 percent.
+
+    Returns:
+        typing.List[str]: a description of every regression.
+    """
+    previous_results = {(result["lines"], result["mode"]): result
+                        for result in baseline}
+    regressions = list()
+    for result in results:
+        previous = previous_results.get((result["lines"], result["mode"]))
+        if previous is None:
+            continue
+        for metric in HIGHER_IS_BETTER + LOWER_IS_BETTER:
+            if metric in HIGHER_IS_BETTER:
+                regressed = result[metric] < previous[metric] * (1 - threshold)
+            else:
+                regressed = result[metric] > previous[metric] * (1 + threshold)
+            if regressed:
+                regressions.append("{} lines, {}: {} went from {:.0f} to "
+                                   "{:.0f}".format(result["lines"],
+                                                   result["mode"], metric,
+                                                   previous[metric],
+                                                   result[metric]))
+    return regressions
+
+
+if "__main__" == __name__:
+    # Runs the benchmarks, writes the results as JSON and compares them to
+    # the results of a previous run, if given.
+    arguments_parser = argparse.ArgumentParser(
+        prog="Benchmark", description="Measures the throughput and the "
+                                      "memory use of the assembler.")
+    arguments_parser.add_argument(
+        "--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+        help="the numbers of lines of the generated programs")
+    arguments_parser.add_argument(
+        "--modes", nargs="+", default=DEFAULT_MODES, choices=DEFAULT_MODES)
+    arguments_parser.add_argument(
+        "--label-density", type=float, default=0.05,
+        help="the fraction of lines that declare a label")
+    arguments_parser.add_argument(
+        "--variables", type=int, default=100,
+        help="the number of distinct variables")
+    arguments_parser.add_argument(
+        "--shift-ratio", type=float, default=0.05,
+        help="the fraction of C-Commands that are shift commands")
+    arguments_parser.add_argument(
+        "--output", help="write the results to this JSON file")
+    arguments_parser.add_argument(
+        "--baseline", help="a JSON file written by a previous run to compare "
+                           "to")
+    arguments_parser.add_argument(
+        "--threshold", type=float, default=0.1,
+        help="the relative change that counts as a regression")
+    arguments = arguments_parser.parse_args()
+    benchmark_results = run_benchmarks(
+        arguments.sizes, arguments.modes, arguments.label_density,
+        arguments.variables, arguments.shift_ratio)
+    if arguments.output:
+        with open(arguments.output, 'w') as results_file:
+            json.dump({"parameters": {
+                "label_density": arguments.label_density,
+                "variables": arguments.variables,
+                "shift_ratio": arguments.shift_ratio},
+                "results": benchmark_results}, results_file, indent=2)
+    if arguments.baseline:
+        with open(arguments.baseline, 'r') as baseline_file:
+            baseline_results = json.load(baseline_file)["results"]
+        found_regressions = find_regressions(
+            benchmark_results, baseline_results, arguments.threshold)
+        for regression in found_regressions:
+            print(regression, file=sys.stderr)
+        if found_regressions:
+            sys.exit("{} regressions past {:.0%}".format(
+                len(found_regressions), arguments.threshold))
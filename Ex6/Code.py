@@ -4,6 +4,13 @@ https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
 and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0 
 Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
 """
+import functools
+import typing
+
+try:
+    import numpy
+except ImportError:  # numpy is optional, and only speeds up render_words.
+    numpy = None
 
 DEST_TRANSLATE = {"": "000", "M": "001", "D": "010", "MD": "011", "A": "100",
                   "AM": "101", "AD": "110", "AMD": "111"}
@@ -21,9 +28,21 @@ COMP_TRANSLATE = {"0": "0101010", "1": "0111111", "-1": "0111010",
                   "M<<": "1100000", "D>>": "0010000", "A>>": "0000000",
                   "M>>": "1000000"}
 
+# Equivalent spellings of comp mnemonics, mapped to the ones in COMP_TRANSLATE:
+COMP_ALIASES = {"A+D": "D+A", "M+D": "D+M", "A&D": "D&A", "M&D": "D&M",
+                "A|D": "D|A", "M|D": "D|M"}
+DEST_ORDER = "AMD"
+
 JUMP_TRANSLATE = {"": "000", "JGT": "001", "JEQ": "010", "JGE": "011",
                   "JLT": "100", "JNE": "101", "JLE": "110", "JMP": "111"}
 
+C_COMMAND_PREFIX = "111"
+SHIFT_C_COMMAND_PREFIX = "101"
+# Real programs use only a few hundred distinct C-Commands:
+C_COMMAND_CACHE_SIZE = 4096
+WORD_FORMAT = "{0:016b}\n"
+WORD_BITS = 16
+
 
 class Code:
     """Translates Hack assembly language mnemonics into binary codes."""
@@ -60,3 +79,69 @@ class Code:
             str: 3-bit long binary code of the given mnemonic.
         """
         return JUMP_TRANSLATE[mnemonic]
+
+    @staticmethod
+    def c_command(dest: str, comp: str, jump: str) -> typing.Tuple[int, str]:
+        """Encodes a whole C-Command. The mnemonics are normalized first, and
+        the result is cached for every distinct normalized (dest, comp,
+        jump), so AM and MA, or D+M and M+D, share an entry. The cache
+        statistics (hits, misses, current size) are available through
+        Code.c_command_cache_info().
+
+        Args:
+            dest (str): a dest mnemonic string, in any order of registers.
+            comp (str): a comp mnemonic string, where the operands of
+            commutative operations may appear in any order.
+            jump (str): a jump mnemonic string.
+
+        Returns:
+            typing.Tuple[int, str]: the 16-bit word of the command, both as an
+            int and as a 16-bit long binary string.
+        """
+        return Code._encode_c_command(
+            "".join(sorted(dest, key=DEST_ORDER.index)),
+            COMP_ALIASES.get(comp, comp), jump)
+
+    @staticmethod
+    def c_command_cache_info() -> typing.Any:
+        """
+        Returns:
+            typing.Any: the cache statistics of c_command, as returned by the
+            cache_info method of functools.lru_cache.
+        """
+        return Code._encode_c_command.cache_info()
+
+    @staticmethod
+    def render_words(words: typing.Sequence[int]) -> str:
+        """Renders words as the text of a .hack file. With numpy, all the
+        words are rendered at once: their bits are unpacked into a matrix of
+        characters, with a column of newlines appended.
+
+        Args:
+            words (typing.Sequence[int]): 16-bit words.
+
+        Returns:
+            str: a 16-bit long binary string and a newline for every word.
+        """
+        if numpy is None:
+            return "".join([WORD_FORMAT.format(word) for word in words])
+        bits = numpy.unpackbits(numpy.asarray(words, dtype=">u2").view(
+            numpy.uint8)).reshape(-1, WORD_BITS)
+        characters = numpy.empty((len(bits), WORD_BITS + 1), numpy.uint8)
+        characters[:, :WORD_BITS] = bits + ord("0")
+        characters[:, WORD_BITS] = ord("\n")
+        return characters.tobytes().decode("ascii")
+
+    # HELP METHODS:
+
+    @staticmethod
+    @functools.lru_cache(maxsize=C_COMMAND_CACHE_SIZE)
+    def _encode_c_command(dest, comp, jump):
+        """Returns the word of a C-Command with normalized mnemonics, as an
+        int and as a binary string."""
+        if ">>" in comp or "<<" in comp:
+            prefix = SHIFT_C_COMMAND_PREFIX
+        else:
+            prefix = C_COMMAND_PREFIX
+        word = prefix + Code.comp(comp) + Code.dest(dest) + Code.jump(jump)
+        return int(word, 2), word
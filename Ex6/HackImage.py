@@ -0,0 +1,103 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in  
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0 
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import array
+import ast
+import mmap
+import sys
+import typing
+
+TEXT_FORMAT = "hack"
+BINARY_FORMAT = "hackbin"
+NUMPY_FORMAT = "npy"
+EXTENSIONS = {TEXT_FORMAT: ".hack", BINARY_FORMAT: ".hackbin",
+              NUMPY_FORMAT: ".npy"}
+BYTEORDERS = {"little": "<", "big": ">"}
+NUMPY_MAGIC = b"\x93NUMPY\x01\x00"
+NUMPY_HEADER_ALIGNMENT = 64
+
+
+class HackImage:
+    """Converts assembled Hack programs between the textual .hack format and
+    binary word images: a raw .hackbin image of 16-bit words, and a .npy file
+    that numpy.load can memory-map. Both binary images can be loaded with no
+    parsing at all.
+    """
+
+    @staticmethod
+    def write_image(words: array.array, output_file: typing.BinaryIO,
+                    image_format: str = BINARY_FORMAT,
+                    byteorder: str = "little") -> None:
+        """Writes the words as a binary image.
+
+        Args:
+            words (array.array): the words to write, of type "H".
+            output_file (typing.BinaryIO): the file to write to.
+            image_format (str): BINARY_FORMAT or NUMPY_FORMAT.
+            byteorder (str): "little" or "big".
+        """
+        assert image_format in (BINARY_FORMAT, NUMPY_FORMAT)
+        if image_format == NUMPY_FORMAT:
+            output_file.write(HackImage._numpy_header(len(words), byteorder))
+        if byteorder != sys.byteorder:
+            words = array.array("H", words)
+            words.byteswap()
+        words.tofile(output_file)
+
+    @staticmethod
+    def load_image(path: str, byteorder: str = "little") -> \
+            typing.Union[memoryview, array.array]:
+        """Loads a binary image written by write_image. The file is mmapped,
+        and when its byte order is the native one the words are returned
+        without being copied.
+
+        Args:
+            path (str): the path of a .hackbin or a .npy file.
+            byteorder (str): the byte order of a .hackbin file ("little" or
+            "big"). The byte order of a .npy file is read from its header.
+
+        Returns:
+            typing.Union[memoryview, array.array]: the words of the program.
+        """
+        with open(path, "rb") as image_file:
+            if image_file.seek(0, 2) == 0:
+                return array.array("H")
+            image = mmap.mmap(image_file.fileno(), 0, access=mmap.ACCESS_READ)
+        offset = 0
+        if image[:len(NUMPY_MAGIC)] == NUMPY_MAGIC:
+            offset, byteorder = HackImage._parse_numpy_header(image)
+        words = memoryview(image)[offset:].cast("H")
+        if byteorder == sys.byteorder:
+            return words
+        words = array.array("H", words)
+        words.byteswap()
+        return words
+
+    # HELP METHODS:
+
+    @staticmethod
+    def _numpy_header(length: int, byteorder: str) -> bytes:
+        """Returns a version 1.0 .npy header for a 1-D array of uint16."""
+        header = "{{'descr': '{}u2', 'fortran_order': False, " \
+                 "'shape': ({},), }}".format(BYTEORDERS[byteorder], length)
+        header_length = len(NUMPY_MAGIC) + 2 + len(header) + 1
+        header += " " * (-header_length % NUMPY_HEADER_ALIGNMENT) + "\n"
+        return NUMPY_MAGIC + len(header).to_bytes(2, "little") + \
+            header.encode("latin1")
+
+    @staticmethod
+    def _parse_numpy_header(image: mmap.mmap) -> typing.Tuple[int, str]:
+        """Returns the offset of the data in a .npy image and its byte
+        order."""
+        header_start = len(NUMPY_MAGIC) + 2
+        header_length = int.from_bytes(image[len(NUMPY_MAGIC):header_start],
+                                       "little")
+        header = ast.literal_eval(image[header_start:header_start +
+                                        header_length].decode("latin1"))
+        assert header["descr"][1:] == "u2" and not header["fortran_order"]
+        if header["descr"][0] == ">":
+            return header_start + header_length, "big"
+        return header_start + header_length, "little"
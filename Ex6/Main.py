@@ -4,16 +4,29 @@ https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
 and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0 
 Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
 """
+import argparse
+import array
+import concurrent.futures
+import contextlib
 import os
 import sys
 import typing
 from SymbolTable import SymbolTable
-from Parser import Parser
+from Parser import Parser, Command
 from Code import Code
+from HackImage import HackImage, EXTENSIONS, TEXT_FORMAT
+from Optimizer import Optimizer
+from SourceMap import SourceMap, MAP_EXTENSION
 
 from Parser import A_COMMAND, C_COMMAND, L_COMMAND
 
 FIRST_FREE_RAM_ADDRESS = 16
+A_COMMAND_FORMAT = "0{0:015b}"
+TWO_PASS = "two-pass"
+SINGLE_PASS = "single-pass"
+STREAMING = "streaming"
+BATCH = "batch"
+MAX_A_COMMAND_VALUE = 2 ** 15 - 1
 
 
 def assemble_file_first_pass(parser: Parser,
@@ -26,22 +39,20 @@ def assemble_file_first_pass(parser: Parser,
         symbol_table (SymbolTable): the table of the form symbol->value.
     """
     rom_address = 0
-    while parser.has_more_commands():
-        if parser.command_type() == L_COMMAND:
-            symbol = parser.symbol()
-            symbol_table.add_entry(symbol, rom_address)
+    for command in parser.commands():
+        if command.command_type == L_COMMAND:
+            symbol_table.add_entry(command.symbol, rom_address)
         else:
             rom_address += 1
-        parser.advance()
 
 
-def write_a_command(parser: Parser, symbol_table: SymbolTable,
+def write_a_command(command: Command, symbol_table: SymbolTable,
                     ram_address: int, output_file: typing.TextIO) -> int:
-    """Writes the A-Command string into the output file based on the current
+    """Writes the A-Command string into the output file based on the given
     command that is an A-Command.
 
     Args:
-        parser (Parser): the parser object.
+        command (Command): the decoded A-Command.
         symbol_table (SymbolTable): the table of the form symbol->value.
         ram_address (int): the current first free RAM address.
         output_file (typing.TextIO): the file to write to.
@@ -49,41 +60,44 @@ def write_a_command(parser: Parser, symbol_table: SymbolTable,
     Returns:
           the updated first free RAM address.
     """
-    string_to_write = "0"
-    symbol = parser.symbol()
+    symbol = command.symbol
     if symbol.isnumeric():
-        string_to_write += str("{0:015b}".format(int(symbol)))
+        string_to_write = A_COMMAND_FORMAT.format(int(symbol))
     elif symbol_table.contains(symbol):
-        string_to_write += str("{0:015b}".format(symbol_table.get_address(
-            symbol)))
+        string_to_write = A_COMMAND_FORMAT.format(
+            symbol_table.get_address(symbol))
     else:
         symbol_table.add_entry(symbol, ram_address)
-        string_to_write += str("{0:015b}".format(ram_address))
+        string_to_write = A_COMMAND_FORMAT.format(ram_address)
         ram_address += 1
     output_file.write(string_to_write + "\n")
-    parser.advance()
     return ram_address
 
 
-def write_c_command(parser: Parser, output_file: typing.TextIO) ->\
+def encode_c_command(command: Command) -> str:
+    """Encodes the given command, that is a C-Command, into its binary
+    string.
+
+    Args:
+        command (Command): the decoded C-Command.
+
+    Returns:
+        str: the 16-bit long binary code of the command.
+    """
+    return Code.c_command(command.dest, command.comp, command.jump)[1]
+
+
+def write_c_command(command: Command, output_file: typing.TextIO) ->\
         None:
-    """Writes the C-Command string into the output file based on the current
-    command that is an A-Command.
+    """Writes the C-Command string into the output file based on the given
+    command that is a C-Command.
 
     Args:
-        parser (Parser): the parser object.
+        command (Command): the decoded C-Command.
         output_file (typing.TextIO): the file to write to.
 
     """
-    if parser.is_shift_operation():
-        string_to_write = "101"
-    else:
-        string_to_write = "111"
-    string_to_write += Code.comp(parser.comp())
-    string_to_write += Code.dest(parser.dest())
-    string_to_write += Code.jump(parser.jump())
-    output_file.write(string_to_write + "\n")
-    parser.advance()
+    output_file.write(encode_c_command(command) + "\n")
 
 
 def assemble_file_second_pass(parser: Parser,
@@ -98,24 +112,200 @@ def assemble_file_second_pass(parser: Parser,
         output_file (typing.TextIO): the file to write to.
     """
     ram_address = FIRST_FREE_RAM_ADDRESS
-    while parser.has_more_commands():
-        if parser.command_type() == A_COMMAND:
-            ram_address = write_a_command(parser, symbol_table, ram_address,
+    for command in parser.commands():
+        if command.command_type == A_COMMAND:
+            ram_address = write_a_command(command, symbol_table, ram_address,
                                           output_file)
-        elif parser.command_type() == C_COMMAND:
-            write_c_command(parser, output_file)
+        elif command.command_type == C_COMMAND:
+            write_c_command(command, output_file)
+        # L-Commands (label declarations) were handled in the first pass.
+
+
+def assemble_file_single_pass(parser: Parser,
+                              symbol_table: SymbolTable,
+                              output_file: typing.TextIO) -> None:
+    """Assembles the program in a single pass over the input. Labels are
+    entered into the symbol table as soon as they are declared, and every
+    A-Command whose symbol is still unknown is recorded in a fixup list and
+    patched once the whole program was read. A symbol that is still unknown at
+    that point is a variable, and the fixups are resolved in the order of
+    appearance so variables get the same RAM addresses as in the two-pass
+    implementation.
+
+    Args:
+        parser (Parser): the parser object.
+        symbol_table (SymbolTable): the table of the form symbol->value.
+        output_file (typing.TextIO): the file to write to.
+    """
+    words = list()
+    fixups = list()  # pairs of the form (rom address, symbol).
+    for command in parser.commands():
+        if command.command_type == A_COMMAND:
+            symbol = command.symbol
+            if symbol.isnumeric():
+                words.append(A_COMMAND_FORMAT.format(int(symbol)))
+            elif symbol_table.contains(symbol):
+                words.append(A_COMMAND_FORMAT.format(
+                    symbol_table.get_address(symbol)))
+            else:  # a forward label reference or a variable.
+                fixups.append((len(words), symbol))
+                words.append("")
+        elif command.command_type == C_COMMAND:
+            words.append(encode_c_command(command))
         else:  # case L-Command (label declaration)
-            parser.advance()
-            continue
+            symbol_table.add_entry(command.symbol, len(words))
+    ram_address = FIRST_FREE_RAM_ADDRESS
+    for rom_address, symbol in fixups:
+        if not symbol_table.contains(symbol):
+            symbol_table.add_entry(symbol, ram_address)
+            ram_address += 1
+        words[rom_address] = A_COMMAND_FORMAT.format(
+            symbol_table.get_address(symbol))
+    for word in words:
+        output_file.write(word + "\n")
 
 
-def assemble_file(input_file: typing.TextIO, output_file: typing.TextIO) -> \
-        None:
+def assemble_words(parser: Parser, symbol_table: SymbolTable) -> \
+        typing.Tuple[typing.List[int], typing.Dict[int, int]]:
+    """Assembles the program into a list of words, resolving symbols like
+    assemble_file_single_pass does, without rendering any of them as text.
+
+    Args:
+        parser (Parser): the parser object.
+        symbol_table (SymbolTable): the table of the form symbol->value.
+
+    Returns:
+        typing.Tuple[typing.List[int], typing.Dict[int, int]]: the words of
+        the program, and the values of the A-Commands that do not fit in 15
+        bits (in programs larger than the ROM) by their index. The words of
+        such A-Commands are 0.
+    """
+    words = list()
+    oversized = dict()
+    fixup_indices = list()
+    fixup_symbols = list()
+    for command in parser.commands():
+        if command.command_type == A_COMMAND:
+            symbol = command.symbol
+            if symbol.isnumeric():
+                value = int(symbol)
+            elif symbol_table.contains(symbol):
+                value = symbol_table.get_address(symbol)
+            else:  # a forward label reference or a variable.
+                fixup_indices.append(len(words))
+                fixup_symbols.append(symbol)
+                value = 0
+            if value > MAX_A_COMMAND_VALUE:
+                oversized[len(words)] = value
+                value = 0
+            words.append(value)
+        elif command.command_type == C_COMMAND:
+            words.append(Code.c_command(command.dest, command.comp,
+                                        command.jump)[0])
+        else:  # case L-Command (label declaration)
+            symbol_table.add_entry(command.symbol, len(words))
+    ram_address = FIRST_FREE_RAM_ADDRESS
+    for index, symbol in zip(fixup_indices, fixup_symbols):
+        if not symbol_table.contains(symbol):
+            symbol_table.add_entry(symbol, ram_address)
+            ram_address += 1
+        value = symbol_table.get_address(symbol)
+        if value > MAX_A_COMMAND_VALUE:
+            oversized[index] = value
+        else:
+            words[index] = value
+    return words, oversized
+
+
+def assemble_file_batch(parser: Parser, symbol_table: SymbolTable,
+                        output_file: typing.TextIO) -> None:
+    """Assembles the program into words (see assemble_words) and renders all
+    of them as text at once (see Code.render_words), instead of formatting
+    every command separately.
+
+    Args:
+        parser (Parser): the parser object.
+        symbol_table (SymbolTable): the table of the form symbol->value.
+        output_file (typing.TextIO): the file to write to.
+    """
+    words, oversized = assemble_words(parser, symbol_table)
+    text = Code.render_words(words)
+    if oversized:  # rendered like the other modes do, with more than 16 bits.
+        lines = text.splitlines(keepends=True)
+        for index, value in oversized.items():
+            lines[index] = A_COMMAND_FORMAT.format(value) + "\n"
+        text = "".join(lines)
+    output_file.write(text)
+
+
+def assemble_file_streaming(input_file: typing.TextIO,
+                            symbol_table: SymbolTable,
+                            output_file: typing.TextIO,
+                            map_file: typing.Optional[typing.TextIO] = None) \
+        -> None:
+    """Assembles the program while reading it line by line, so the memory in
+    use grows with the number of symbols and not with the size of the
+    program. The commands are decoded lazily (see Parser.stream_commands)
+    and every word is written as soon as it is encoded. Instead of keeping a
+    fixup for every forward reference, the labels are collected by a first
+    read of the input, so the input file must be seekable.
+
+    Args:
+        input_file (typing.TextIO): the file to assemble.
+        symbol_table (SymbolTable): the table of the form symbol->value.
+        output_file (typing.TextIO): the file to write to.
+        map_file (typing.Optional[typing.TextIO]): if given, the source map
+        is written to it during the first read.
+    """
+    start_position = input_file.tell()
+    rom_address = 0
+    for command in Parser.stream_commands(input_file):
+        if map_file is not None:
+            SourceMap.write_command(command, map_file)
+        if command.command_type == L_COMMAND:
+            symbol_table.add_entry(command.symbol, rom_address)
+        else:
+            rom_address += 1
+    input_file.seek(start_position)
+    ram_address = FIRST_FREE_RAM_ADDRESS
+    for command in Parser.stream_commands(input_file):
+        if command.command_type == A_COMMAND:
+            ram_address = write_a_command(command, symbol_table, ram_address,
+                                          output_file)
+        elif command.command_type == C_COMMAND:
+            write_c_command(command, output_file)
+
+
+def add_variables(symbol_table: SymbolTable,
+                  variables: typing.List[str]) -> None:
+    """Allocates RAM addresses to the given variables, in order, as the
+    second pass would have done when first seeing them.
+
+    Args:
+        symbol_table (SymbolTable): the table of the form symbol->value.
+        variables (typing.List[str]): the variables to add.
+    """
+    for ram_address, variable in enumerate(variables, FIRST_FREE_RAM_ADDRESS):
+        symbol_table.add_entry(variable, ram_address)
+
+
+def assemble_file(input_file: typing.TextIO, output_file: typing.TextIO,
+                  mode: str = TWO_PASS, optimize: bool = False,
+                  map_file: typing.Optional[typing.TextIO] = None) -> None:
     """Assembles a single file.
 
     Args:
         input_file (typing.TextIO): the file to assemble.
         output_file (typing.TextIO): writes all output to this file.
+        mode (str): TWO_PASS (the implementation described below),
+        SINGLE_PASS (see assemble_file_single_pass), STREAMING (see
+        assemble_file_streaming) or BATCH (see assemble_file_batch). All the
+        modes produce the same output.
+        optimize (bool): if True, the commands pass through the peephole
+        optimizer (see Optimizer) before they are encoded. Cannot be used
+        with the STREAMING mode, which never holds the whole program.
+        map_file (typing.Optional[typing.TextIO]): if given, a source map of
+        the assembled program is written to it (see SourceMap).
     """
     # Your code goes here!
     #
@@ -153,32 +343,243 @@ def assemble_file(input_file: typing.TextIO, output_file: typing.TextIO) -> \
     # After the command is translated, write the translation to the output
     # file.
     symbol_table = SymbolTable()  # create a symbol table object
-    parser = Parser(input_file)  # create a parser object
+    if map_file is not None:
+        SourceMap.write_header(map_file)
+    if mode == STREAMING:
+        assert not optimize
+        assemble_file_streaming(input_file, symbol_table, output_file,
+                                map_file)
+        return
+    parser = parse_program(input_file, symbol_table, optimize, map_file)
+    if mode == SINGLE_PASS:
+        assemble_file_single_pass(parser, symbol_table, output_file)
+        return
+    if mode == BATCH:
+        assemble_file_batch(parser, symbol_table, output_file)
+        return
     assemble_file_first_pass(parser, symbol_table)
-    parser.set_to_zero()
     assemble_file_second_pass(parser, symbol_table, output_file)
 
 
+def parse_program(input_file: typing.TextIO, symbol_table: SymbolTable,
+                  optimize: bool = False,
+                  map_file: typing.Optional[typing.TextIO] = None) -> Parser:
+    """Parses a program, and optimizes it and writes the commands of its
+    source map if needed.
+
+    Args:
+        input_file (typing.TextIO): the file to assemble.
+        symbol_table (SymbolTable): the table of the form symbol->value, that
+        the variables of the original program are added to when it is
+        optimized.
+        optimize (bool): whether to run the peephole optimizer.
+        map_file (typing.Optional[typing.TextIO]): if given, the commands of
+        the source map are written to it (after its header).
+
+    Returns:
+        Parser: the parser of the program.
+    """
+    parser = Parser(input_file)  # create a parser object
+    if optimize:
+        add_variables(symbol_table, Optimizer.optimize(parser.commands()))
+    if map_file is not None:
+        for command in parser.commands():
+            SourceMap.write_command(command, map_file)
+    return parser
+
+
+def assemble_image(input_file: typing.TextIO, optimize: bool = False,
+                   map_file: typing.Optional[typing.TextIO] = None) -> \
+        array.array:
+    """Assembles a single file into words (see assemble_words), for the
+    binary image formats, without rendering them as text.
+
+    Args:
+        input_file (typing.TextIO): the file to assemble.
+        optimize (bool): whether to run the peephole optimizer.
+        map_file (typing.Optional[typing.TextIO]): if given, a source map of
+        the assembled program is written to it (see SourceMap).
+
+    Returns:
+        array.array: the words of the program, of type "H".
+
+    Raises:
+        ValueError: if an A-Command does not fit in 15 bits, since a word of
+        an image cannot hold it.
+    """
+    symbol_table = SymbolTable()
+    if map_file is not None:
+        SourceMap.write_header(map_file)
+    parser = parse_program(input_file, symbol_table, optimize, map_file)
+    words, oversized = assemble_words(parser, symbol_table)
+    if oversized:
+        index, value = min(oversized.items())
+        raise ValueError("the value {} of the A-Command at {} does not fit "
+                         "in 15 bits".format(value, index))
+    return array.array("H", words)
+
+
+def assemble_path(input_path: str, output_format: str = TEXT_FORMAT,
+                  byteorder: str = "little", mode: str = TWO_PASS,
+                  optimize: bool = False, source_map: bool = False) -> str:
+    """Assembles the .asm file in the given path into a file with the same
+    name, in the given output format.
+
+    Args:
+        input_path (str): the path of the file to assemble.
+        output_format (str): one of the formats in HackImage.EXTENSIONS.
+        byteorder (str): the byte order of a binary output format.
+        mode (str): the assembly mode of the text format, as in
+        assemble_file. The binary formats are assembled by assemble_image.
+        optimize (bool): whether to run the peephole optimizer.
+        source_map (bool): whether to write a source map next to the output
+        file, with the extension MAP_EXTENSION added to its name.
+
+    Returns:
+        str: the path of the output file.
+    """
+    filename, extension = os.path.splitext(input_path)
+    output_path = filename + EXTENSIONS[output_format]
+    with contextlib.ExitStack() as map_stack:
+        map_file = None
+        if source_map:
+            map_file = map_stack.enter_context(
+                open(output_path + MAP_EXTENSION, 'w'))
+        with open(input_path, 'r') as input_file:
+            if output_format == TEXT_FORMAT:
+                with open(output_path, 'w') as output_file:
+                    assemble_file(input_file, output_file, mode, optimize,
+                                  map_file)
+                return output_path
+            words = assemble_image(input_file, optimize, map_file)
+    with open(output_path, 'wb') as output_file:
+        HackImage.write_image(words, output_file, output_format, byteorder)
+    return output_path
+
+
+def _assemble_path_and_report(input_path: str, output_format: str,
+                              byteorder: str, mode: str, optimize: bool,
+                              source_map: bool) -> \
+        typing.Optional[str]:
+    """Runs assemble_path in a worker process, and returns a description of
+    the error that occurred, or None if the file was assembled."""
+    try:
+        assemble_path(input_path, output_format, byteorder, mode, optimize,
+                      source_map)
+    except Exception as error:
+        return "{}: {}".format(type(error).__name__, error)
+    return None
+
+
+def assemble_paths_in_parallel(input_paths: typing.List[str], jobs: int,
+                               output_format: str = TEXT_FORMAT,
+                               byteorder: str = "little",
+                               mode: str = TWO_PASS,
+                               optimize: bool = False,
+                               source_map: bool = False) -> \
+        typing.Dict[str, str]:
+    """Assembles the given files, spread across a pool of processes. An error
+    in one file does not stop the assembly of the others.
+
+    Args:
+        input_paths (typing.List[str]): the paths of the files to assemble.
+        jobs (int): the number of processes to use, or 0 to use one process
+        per CPU.
+        output_format (str): one of the formats in HackImage.EXTENSIONS.
+        byteorder (str): the byte order of a binary output format.
+        mode (str): the assembly mode, as in assemble_file.
+        optimize (bool): whether to run the peephole optimizer.
+        source_map (bool): whether to write source maps, as in
+        assemble_path.
+
+    Returns:
+        typing.Dict[str, str]: the error of every file that failed to
+        assemble, by path.
+    """
+    errors = dict()
+    with concurrent.futures.ProcessPoolExecutor(jobs or None) as executor:
+        futures = {executor.submit(_assemble_path_and_report, input_path,
+                                   output_format, byteorder, mode,
+                                   optimize, source_map):
+                   input_path for input_path in input_paths}
+        for future in concurrent.futures.as_completed(futures):
+            error = future.result()
+            if error is not None:
+                errors[futures[future]] = error
+    return errors
+
+
 if "__main__" == __name__:
     # Parses the input path and calls assemble_file on each input file.
     # This opens both the input and the output files!
     # Both are closed automatically when the code finishes running.
     # If the output file does not exist, it is created automatically in the
     # correct path, using the correct filename.
-    if not len(sys.argv) == 2:
-        sys.exit("Invalid usage, please use: Assembler <input path>")
-    argument_path = os.path.abspath(sys.argv[1])
+    arguments_parser = argparse.ArgumentParser(
+        prog="Assembler",
+        usage="Assembler [--single-pass | --streaming | --batch] "
+              "[--format {hack,hackbin,npy}] [--byteorder {little,big}] "
+              "[--jobs N] [--optimize] "
+              "[--source-map] <input path>")
+    arguments_parser.add_argument("input_path")
+    mode_arguments = arguments_parser.add_mutually_exclusive_group()
+    mode_arguments.add_argument(
+        "--single-pass", action="store_const", dest="mode",
+        const=SINGLE_PASS, default=TWO_PASS,
+        help="assemble every file in a single pass with label backpatching")
+    mode_arguments.add_argument(
+        "--streaming", action="store_const", dest="mode", const=STREAMING,
+        help="assemble every file while reading it line by line, keeping "
+             "only the symbol table in memory")
+    mode_arguments.add_argument(
+        "--batch", action="store_const", dest="mode", const=BATCH,
+        help="assemble every file into words and render all of them at once "
+             "(with numpy, if it is installed)")
+    arguments_parser.add_argument(
+        "--format", choices=list(EXTENSIONS), default=TEXT_FORMAT,
+        help="hack: 16 characters per word, hackbin: a raw image of 16-bit "
+             "words, npy: the same image with a numpy.load header")
+    arguments_parser.add_argument(
+        "--byteorder", choices=["little", "big"], default="little",
+        help="the byte order of the words in a binary image")
+    arguments_parser.add_argument(
+        "--jobs", type=int, default=1, metavar="N",
+        help="assemble the files of a directory in N processes (0 means one "
+             "per CPU)")
+    arguments_parser.add_argument(
+        "--optimize", action="store_true",
+        help="remove redundant loads, unreachable code and jumps to the next "
+             "command, and thread chains of jumps")
+    arguments_parser.add_argument(
+        "--source-map", action="store_true",
+        help="write a <output file>.map file that maps every ROM address to "
+             "its .asm line and label")
+    arguments = arguments_parser.parse_args()
+    if arguments.optimize and arguments.mode == STREAMING:
+        arguments_parser.error("--optimize cannot be used with --streaming")
+    argument_path = os.path.abspath(arguments.input_path)
     if os.path.isdir(argument_path):
         files_to_assemble = [
             os.path.join(argument_path, filename)
             for filename in os.listdir(argument_path)]
     else:
         files_to_assemble = [argument_path]
-    for input_path in files_to_assemble:
-        filename, extension = os.path.splitext(input_path)
-        if extension.lower() != ".asm":
-            continue
-        output_path = filename + ".hack"
-        with open(input_path, 'r') as input_file, \
-                open(output_path, 'w') as output_file:
-            assemble_file(input_file, output_file)
+    files_to_assemble = [
+        input_path for input_path in files_to_assemble
+        if os.path.splitext(input_path)[1].lower() == ".asm"]
+    if arguments.jobs == 1 or len(files_to_assemble) < 2:
+        for input_path in files_to_assemble:
+            assemble_path(input_path, arguments.format, arguments.byteorder,
+                          arguments.mode, arguments.optimize,
+                          arguments.source_map)
+    else:
+        failed_files = assemble_paths_in_parallel(
+            files_to_assemble, arguments.jobs, arguments.format,
+            arguments.byteorder, arguments.mode, arguments.optimize,
+            arguments.source_map)
+        for input_path in sorted(failed_files):
+            print("{}: {}".format(input_path, failed_files[input_path]),
+                  file=sys.stderr)
+        if failed_files:
+            sys.exit("Failed to assemble {} of {} files".format(
+                len(failed_files), len(files_to_assemble)))
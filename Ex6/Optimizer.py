@@ -0,0 +1,220 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in  
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0 
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import typing
+from Parser import Command, A_COMMAND, C_COMMAND, L_COMMAND
+from SymbolTable import PREDEFINED_SYMBOLS
+
+UNCONDITIONAL_JUMP = "JMP"
+
+
+class Optimizer:
+    """A peephole optimizer for decoded assembly commands, that runs between
+    parsing and encoding. It removes commands that can never have an effect,
+    and so shrinks both the ROM and the number of executed instructions.
+    Jumps are assumed to go only to labels: a program that jumps to numeric
+    ROM addresses must not be optimized.
+    """
+
+    @staticmethod
+    def optimize(commands: typing.List[Command]) -> typing.List[str]:
+        """Optimizes the commands in place, until no more optimizations apply.
+
+        Args:
+            commands (typing.List[Command]): the decoded commands of a
+            program, for example Parser.commands().
+
+        Returns:
+            typing.List[str]: the variables of the original program, in the
+            order of their first appearance. Adding them to the symbol table
+            in this order before assembling keeps their RAM addresses as they
+            were without the optimization, even if some of their references
+            were removed.
+        """
+        variables = Optimizer._get_variables(commands)
+        optimizations = [Optimizer._thread_jumps,
+                         Optimizer._remove_jumps_to_next_command,
+                         Optimizer._remove_unreachable_commands,
+                         Optimizer._remove_redundant_loads,
+                         Optimizer._remove_redundant_reloads]
+        changed = True
+        while changed:
+            changed = False
+            for optimization in optimizations:
+                changed = optimization(commands) or changed
+        return variables
+
+    # HELP METHODS:
+
+    @staticmethod
+    def _get_variables(commands):
+        """Returns the variables of the program in the order of their first
+        appearance."""
+        labels = {command.symbol for command in commands
+                  if command.command_type == L_COMMAND}
+        variables = dict()  # an ordered set.
+        for command in commands:
+            symbol = command.symbol
+            if command.command_type == A_COMMAND and not symbol.isnumeric() \
+                    and symbol not in labels \
+                    and symbol not in PREDEFINED_SYMBOLS:
+                variables[symbol] = None
+        return list(variables)
+
+    @staticmethod
+    def _is_unconditional_jump(command):
+        """Is the command a jump that is always taken?"""
+        return command.command_type == C_COMMAND and \
+            command.jump == UNCONDITIONAL_JUMP
+
+    @staticmethod
+    def _is_plain_unconditional_jump(command):
+        """Is the command an unconditional jump that stores nothing?"""
+        return Optimizer._is_unconditional_jump(command) and not command.dest
+
+    @staticmethod
+    def _is_a_command_or_end(commands, i):
+        """Is the i-th command an A-Command (or past the end of the program)?
+        Code there does not depend on the value of the A register."""
+        return i >= len(commands) or commands[i].command_type == A_COMMAND
+
+    @staticmethod
+    def _get_label_targets(commands):
+        """Returns a dictionary of the form label->index of the first command
+        after it that is not a label."""
+        targets = dict()
+        pending_labels = list()
+        for i, command in enumerate(commands):
+            if command.command_type == L_COMMAND:
+                pending_labels.append(command.symbol)
+                continue
+            for label in pending_labels:
+                targets[label] = i
+            pending_labels = list()
+        for label in pending_labels:
+            targets[label] = len(commands)
+        return targets
+
+    @staticmethod
+    def _get_jump_target(commands, targets, label):
+        """If the code at the label is "@Xxx, 0;JMP" where Xxx is a label,
+        returns Xxx. Otherwise, returns None."""
+        i = targets.get(label, len(commands))
+        if i + 1 >= len(commands) or \
+                commands[i].command_type != A_COMMAND or \
+                commands[i].symbol not in targets or \
+                not Optimizer._is_plain_unconditional_jump(commands[i + 1]):
+            return None
+        return commands[i].symbol
+
+    @staticmethod
+    def _thread_jumps(commands):
+        """Makes jumps to a label whose code only jumps to another label
+        (possibly through a chain of such labels) jump to the final label
+        directly. A conditional jump is threaded only if the A register is not
+        read after it, since it now holds another address. A jump that
+        also stores a value is never threaded, since it may store into M at
+        the address."""
+        targets = Optimizer._get_label_targets(commands)
+        changed = False
+        for i in range(len(commands) - 1):
+            command, jump = commands[i], commands[i + 1]
+            if command.command_type != A_COMMAND or \
+                    command.symbol not in targets or \
+                    jump.command_type != C_COMMAND or not jump.jump or \
+                    jump.dest or "A" in jump.comp or "M" in jump.comp:
+                continue
+            if not Optimizer._is_unconditional_jump(jump) and \
+                    not Optimizer._is_a_command_or_end(commands, i + 2):
+                continue
+            label, visited = command.symbol, {command.symbol}
+            next_label = Optimizer._get_jump_target(commands, targets, label)
+            while next_label is not None and next_label not in visited:
+                label = next_label
+                visited.add(label)
+                next_label = Optimizer._get_jump_target(commands, targets,
+                                                        label)
+            if label != command.symbol:
+                commands[i] = Command("@" + label, command.line_number)
+                changed = True
+        return changed
+
+    @staticmethod
+    def _remove_jumps_to_next_command(commands):
+        """Removes "@Xxx, 0;JMP" when it is directly followed by the label
+        (Xxx)."""
+        optimized = list()
+        i = 0
+        while i < len(commands):
+            command = commands[i]
+            if command.command_type == A_COMMAND and i + 1 < len(commands) \
+                    and Optimizer._is_plain_unconditional_jump(
+                        commands[i + 1]):
+                following_labels = set()
+                j = i + 2
+                while j < len(commands) and \
+                        commands[j].command_type == L_COMMAND:
+                    following_labels.add(commands[j].symbol)
+                    j += 1
+                if command.symbol in following_labels and \
+                        Optimizer._is_a_command_or_end(commands, j):
+                    i += 2
+                    continue
+            optimized.append(command)
+            i += 1
+        return Optimizer._replace(commands, optimized)
+
+    @staticmethod
+    def _remove_unreachable_commands(commands):
+        """Removes the commands between an unconditional jump and the next
+        label, since no command can reach them."""
+        optimized = list()
+        reachable = True
+        for command in commands:
+            if command.command_type == L_COMMAND:
+                reachable = True
+            elif not reachable:
+                continue
+            optimized.append(command)
+            if Optimizer._is_unconditional_jump(command):
+                reachable = False
+        return Optimizer._replace(commands, optimized)
+
+    @staticmethod
+    def _remove_redundant_loads(commands):
+        """Removes an A-Command that is directly followed by another one, since
+        the A register is overwritten before it is used."""
+        optimized = [command for i, command in enumerate(commands)
+                     if command.command_type != A_COMMAND or
+                     i + 1 == len(commands) or
+                     commands[i + 1].command_type != A_COMMAND]
+        return Optimizer._replace(commands, optimized)
+
+    @staticmethod
+    def _remove_redundant_reloads(commands):
+        """Removes an A-Command that loads the value the A register already
+        holds, that is, when the same A-Command came before it and no label
+        and no command that stores into A came in between."""
+        optimized = list()
+        current_symbol = None
+        for command in commands:
+            if command.command_type == A_COMMAND:
+                if command.symbol == current_symbol:
+                    continue
+                current_symbol = command.symbol
+            elif command.command_type == L_COMMAND or "A" in command.dest:
+                current_symbol = None
+            optimized.append(command)
+        return Optimizer._replace(commands, optimized)
+
+    @staticmethod
+    def _replace(commands, optimized):
+        """Replaces the commands with the optimized ones, and returns whether
+        anything changed."""
+        if len(optimized) == len(commands):
+            return False
+        commands[:] = optimized
+        return True
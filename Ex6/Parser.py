@@ -12,6 +12,44 @@ C_COMMAND = "C_COMMAND"
 L_COMMAND = "L_COMMAND"
 
 
+class Command:
+    """A single assembly command, decoded once when the input is parsed.
+    Holds the command type, its fields and the number of the line it appeared
+    in (starting from 1).
+    """
+    __slots__ = ("command_type", "symbol", "dest", "comp", "jump",
+                 "is_shift", "line_number")
+
+    def __init__(self, command: str, line_number: int) -> None:
+        """Decodes the given command.
+
+        Args:
+            command (str): a command without white spaces and comments.
+            line_number (int): the number of the line of the command in the
+            input file.
+        """
+        self.line_number = line_number
+        self.symbol = ""
+        self.dest = ""
+        self.comp = ""
+        self.jump = ""
+        self.is_shift = False
+        if command[0] == "@":
+            self.command_type = A_COMMAND
+            self.symbol = command[1:]
+        elif command[0] == "(" and command[-1] == ")":
+            self.command_type = L_COMMAND
+            self.symbol = command[1:-1]
+        else:
+            self.command_type = C_COMMAND
+            if "=" in command:
+                self.dest, command = command.split("=", 1)
+            if ";" in command:
+                command, self.jump = command.split(";", 1)
+            self.comp = command
+            self.is_shift = ">>" in command or "<<" in command
+
+
 class Parser:
     """Encapsulates access to the input code. Reads and assembly language 
     command, parses it, and provides convenient access to the commands 
@@ -27,15 +65,10 @@ class Parser:
         """
         input_lines = input_file.read().splitlines()
         for i in range(0, len(input_lines)):
-            # Remove white spaces and tabs:
-            input_lines[i] = "".join(input_lines[i].split())
-            input_lines[i] = "".join(input_lines[i].split("\t"))
-            # Remove comments:
-            input_lines[i] = input_lines[i].split("//")[0]
-            input_lines[i] = input_lines[i].split("/**")[0]
-            input_lines[i] = input_lines[i].split("*")[0]
-        # Remove blank lines:
-        self.__input = [line for line in input_lines if line]
+            input_lines[i] = Parser._clean_line(input_lines[i])
+        # Remove blank lines and decode every command exactly once:
+        self.__input = [Command(line, i + 1)
+                        for i, line in enumerate(input_lines) if line]
         # Set the first command to read to be the first line in the input:
         self.__current_command = 0
 
@@ -64,12 +97,7 @@ class Parser:
             "L_COMMAND" (actually, pseudo-command) for (Xxx) where Xxx is a
             symbol
         """
-        current_command = self.__input[self.__current_command]
-        if current_command[0] == "@":
-            return A_COMMAND
-        elif current_command[0] == "(" and current_command[-1] == ")":
-            return L_COMMAND
-        return C_COMMAND
+        return self.__input[self.__current_command].command_type
 
     def symbol(self) -> str:
         """
@@ -80,10 +108,7 @@ class Parser:
         """
         command_type = self.command_type()
         assert command_type == A_COMMAND or command_type == L_COMMAND
-        current_command = self.__input[self.__current_command]
-        if command_type == A_COMMAND:
-            return current_command[1:]
-        return current_command[1:-1]
+        return self.__input[self.__current_command].symbol
 
     def dest(self) -> str:
         """
@@ -92,10 +117,7 @@ class Parser:
             only when commandType() is "C_COMMAND".
         """
         assert self.command_type() == C_COMMAND
-        current_command = self.__input[self.__current_command]
-        if "=" in current_command:
-            return current_command.split("=")[0]
-        return ""
+        return self.__input[self.__current_command].dest
 
     def comp(self) -> str:
         """
@@ -104,12 +126,7 @@ class Parser:
             only when commandType() is "C_COMMAND".
         """
         assert self.command_type() == C_COMMAND
-        current_command = self.__input[self.__current_command]
-        if "=" in current_command:
-            current_command = current_command.split("=")[1]
-        if ";" in current_command:
-            current_command = current_command.split(";")[0]
-        return current_command
+        return self.__input[self.__current_command].comp
 
     def jump(self) -> str:
         """
@@ -118,19 +135,53 @@ class Parser:
             only when commandType() is "C_COMMAND".
         """
         assert self.command_type() == C_COMMAND
-        current_command = self.__input[self.__current_command]
-        if ";" in current_command:
-            return current_command.split(";")[1]
-        return ""
+        return self.__input[self.__current_command].jump
 
     def is_shift_operation(self) -> bool:
         """
         Returns: True if the current operation is a shift operation, false
         otherwise.
         """
-        current_command = self.__input[self.__current_command]
-        return ">>" in current_command or "<<" in current_command
+        return self.__input[self.__current_command].is_shift
 
     def set_to_zero(self):
         """Sets the counter of the current command to zero."""
         self.__current_command = 0
+
+    def commands(self) -> typing.List[Command]:
+        """
+        Returns:
+            typing.List[Command]: all the decoded commands of the input, in
+            order. Lets callers iterate over the program without moving the
+            current command.
+        """
+        return self.__input
+
+    @staticmethod
+    def stream_commands(input_file: typing.TextIO) -> \
+            typing.Iterator[Command]:
+        """Reads the input file line by line and decodes its commands lazily,
+        so only the current line is held in memory.
+
+        Args:
+            input_file (typing.TextIO): input file.
+
+        Returns:
+            typing.Iterator[Command]: the decoded commands of the input, in
+            order.
+        """
+        for line_number, line in enumerate(input_file, 1):
+            line = Parser._clean_line(line)
+            if line:
+                yield Command(line, line_number)
+
+    # HELP METHODS:
+
+    @staticmethod
+    def _clean_line(line: str) -> str:
+        """Removes all the white spaces, tabs and comments from the line."""
+        line = "".join(line.split())
+        line = "".join(line.split("\t"))
+        line = line.split("//")[0]
+        line = line.split("/**")[0]
+        return line.split("*")[0]
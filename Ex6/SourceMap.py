@@ -0,0 +1,85 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in  
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0 
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import array
+import bisect
+import typing
+from Parser import Command, L_COMMAND
+
+MAP_EXTENSION = ".map"
+MAP_HEADER = "// hack source map: one line number per ROM address, " \
+             "(Xxx) declares the label Xxx at the next address"
+
+
+class SourceMap:
+    """Maps ROM addresses of an assembled program back to the lines of its
+    .asm source and to the labels around them. The map is a text file that
+    lists, in ROM order, the .asm line number of every word, with the label
+    declarations (Xxx) in between, exactly where they appear in the source.
+    """
+
+    def __init__(self, map_file: typing.TextIO) -> None:
+        """Loads a source map written by write_command.
+
+        Args:
+            map_file (typing.TextIO): the map file.
+        """
+        self.line_numbers = array.array("L")
+        self.labels = list()  # pairs of the form (address, label), in order.
+        for line in map_file:
+            line = line.rstrip()
+            if line[0] == "(":
+                self.labels.append((len(self.line_numbers), line[1:-1]))
+            elif line[0] != "/":
+                self.line_numbers.append(int(line))
+        self.__label_addresses = [address for address, label in self.labels]
+
+    def line_number(self, address: int) -> int:
+        """
+        Args:
+            address (int): a ROM address.
+
+        Returns:
+            int: the number of the .asm line of the word in the address.
+        """
+        return self.line_numbers[address]
+
+    def scope(self, address: int) -> typing.Optional[str]:
+        """
+        Args:
+            address (int): a ROM address.
+
+        Returns:
+            typing.Optional[str]: the last label declared at or before the
+            address, or None if there is no such label.
+        """
+        i = bisect.bisect_right(self.__label_addresses, address)
+        if i == 0:
+            return None
+        return self.labels[i - 1][1]
+
+    @staticmethod
+    def write_header(map_file: typing.TextIO) -> None:
+        """Writes the first line of a source map.
+
+        Args:
+            map_file (typing.TextIO): the map file.
+        """
+        map_file.write(MAP_HEADER + "\n")
+
+    @staticmethod
+    def write_command(command: Command, map_file: typing.TextIO) -> None:
+        """Adds a command to the source map. Should be called for all the
+        commands of the program in order, after write_header.
+
+        Args:
+            command (Command): the decoded command.
+            map_file (typing.TextIO): the map file.
+        """
+        if command.command_type == L_COMMAND:
+            map_file.write("(" + command.symbol + ")\n")
+        else:
+            map_file.write(str(command.line_number) + "\n")
@@ -23,7 +23,7 @@ class SymbolTable:
         and their pre-allocated RAM addresses, according to section 6.2.3 of the
         book.
         """
-        self.__symbol_table = PREDEFINED_SYMBOLS
+        self.__symbol_table = dict(PREDEFINED_SYMBOLS)
 
     def add_entry(self, symbol: str, address: int) -> None:
         """Adds the pair (symbol, address) to the table.
@@ -0,0 +1,58 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in  
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0 
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import io
+import unittest
+from Parser import Parser, A_COMMAND, L_COMMAND
+from Optimizer import Optimizer
+
+# X only jumps to END, so jumps to X can go to END directly, unless they
+# also store into M at X:
+STORING_JUMP_PROGRAM = """@7
+D=A
+@X
+M=D;JMP
+(X)
+@END
+0;JMP
+(END)
+@END
+0;JMP
+"""
+
+
+class OptimizerTest(unittest.TestCase):
+    """Tests the peephole optimizer."""
+
+    def test_thread_plain_jump(self):
+        program = STORING_JUMP_PROGRAM.replace("M=D;JMP", "0;JMP")
+        self.assertNotIn("@X", optimize(program))
+
+    def test_keep_address_of_storing_jump(self):
+        self.assertEqual(optimize(STORING_JUMP_PROGRAM)[2:4],
+                         ["@X", "M=D;JMP"])
+
+
+def optimize(program):
+    """Returns the texts of the optimized commands of an assembly program."""
+    commands = Parser(io.StringIO(program)).commands()
+    Optimizer.optimize(commands)
+    return [text(command) for command in commands]
+
+
+def text(command):
+    """Returns the text of a decoded command."""
+    if command.command_type == A_COMMAND:
+        return "@" + command.symbol
+    if command.command_type == L_COMMAND:
+        return "({})".format(command.symbol)
+    return "{}{}{}{}".format(command.dest + "=" if command.dest else "",
+                             command.comp, ";" if command.jump else "",
+                             command.jump)
+
+
+if "__main__" == __name__:
+    unittest.main()
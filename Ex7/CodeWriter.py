@@ -15,18 +15,27 @@ COMPARISON_BINARY = ["eq", "gt", "lt"]
 SEGMENTS = {"local": "LCL", "argument": "ARG", "this": "THIS",
             "that": "THAT", "pointer": 3, "temp": 5, "static": 16}
 STACK_START = 256
+# The label of the routine of every comparison of a file, in the shared
+# comparisons mode, like VM.lt.Xxx:
+COMPARISON_ROUTINE = "VM.{}.{}"
 
 
 class CodeWriter:
     """Translates VM commands into Hack assembly code."""
 
-    def __init__(self, output_stream: typing.TextIO) -> None:
+    def __init__(self, output_stream: typing.TextIO,
+                 shared_comparisons: bool = False) -> None:
         """Initializes the CodeWriter.
 
         Args:
             output_stream (typing.TextIO): output stream.
+            shared_comparisons (bool): whether to write eq, gt and lt once,
+            in routines that set_file_name writes: a comparison then takes 4
+            instructions instead of up to 35. The routines get the return
+            address in D, and keep it in R15.
         """
         self.output_stream = output_stream
+        self.shared_comparisons = shared_comparisons
         self.filename = ""
         self.label_num = 0
 
@@ -44,6 +53,12 @@ class CodeWriter:
                  "@SP",
                  "M=D"]
         self._write_to_stream(lines)
+        if self.shared_comparisons:  # the code of the file skips them.
+            start = "VM.start.{}".format(self.filename)
+            self._write_to_stream(["@{}".format(start), "0;JMP"])
+            for command in COMPARISON_BINARY:
+                self._write_comparison_routine(command)
+            self._write_to_stream(["({})".format(start)])
 
     def write_arithmetic(self, command: str) -> None:
         """Writes the assembly code that is the translation of the given
@@ -53,7 +68,9 @@ class CodeWriter:
             command (str): an arithmetic command.
         """
         lines = list()
-        if command in UNARY:
+        if command in COMPARISON_BINARY and self.shared_comparisons:
+            self._write_shared_comparison(command, lines)
+        elif command in UNARY:
             CodeWriter._get_last_stack_address(lines)
             lines.append("M={}M".format(ARITHMETIC_TRANSLATE[command]))
         else:
@@ -99,7 +116,7 @@ class CodeWriter:
         # R15 is already in D.
         lines.extend(["@CONTINUE1_{}.{}".format(self.label_num,
                                                 self.filename),
-                      "D;JGT",
+                      "D;JGE",
                       "@R14",
                       "D=M",
                       "@CONTINUE1_{}.{}".format(self.label_num,
@@ -128,7 +145,7 @@ class CodeWriter:
                       "D=M",
                       "@CONTINUE2_{}.{}".format(self.label_num,
                                                 self.filename),
-                      "D;JGT"])
+                      "D;JGE"])
         CodeWriter._get_last_stack_address(lines)
         if command == "lt":
             lines.append("M=0")
@@ -157,6 +174,66 @@ class CodeWriter:
                       "(CONTINUE3_{}.{})".format(self.label_num,
                                                  self.filename)])
 
+    def _write_comparison_routine(self, command):
+        """Writes the routine of a comparison, which replaces the two values
+        at the top of the stack with the result, and returns to the address
+        in D."""
+        routine = COMPARISON_ROUTINE.format(command, self.filename)
+        lines = ["({})".format(routine),
+                 "@R15",  # R15 = the return address.
+                 "M=D"]
+        CodeWriter._pop_stack_and_decrement_stack_pointer(lines)
+        lines.extend(["@R14",  # R14 = y.
+                      "M=D"])
+        CodeWriter._get_last_stack_address(lines)
+        lines.append("D=M")  # D = x.
+        if command != "eq":  # when the signs differ, x-y can overflow.
+            positive_x_result = "false" if command == "lt" else "true"
+            negative_x_result = "true" if command == "lt" else "false"
+            lines.extend(["@{}$negative_x".format(routine),
+                          "D;JLT",
+                          "@R14",
+                          "D=M",
+                          "@{}${}".format(routine, positive_x_result),
+                          "D;JLT",
+                          "@{}$same_sign".format(routine),
+                          "0;JMP",
+                          "({}$negative_x)".format(routine),
+                          "@R14",
+                          "D=M",
+                          "@{}${}".format(routine, negative_x_result),
+                          "D;JGE",
+                          "({}$same_sign)".format(routine)])
+            CodeWriter._get_last_stack_address(lines)
+            lines.append("D=M")
+        lines.extend(["@R14",
+                      "D=D-M",
+                      "@{}$true".format(routine),
+                      "D;{}".format(ARITHMETIC_TRANSLATE[command]),
+                      "({}$false)".format(routine)])
+        CodeWriter._get_last_stack_address(lines)
+        lines.extend(["M=0",
+                      "@R15",
+                      "A=M",
+                      "0;JMP",
+                      "({}$true)".format(routine)])
+        CodeWriter._get_last_stack_address(lines)
+        lines.extend(["M=-1",
+                      "@R15",
+                      "A=M",
+                      "0;JMP"])
+        self._write_to_stream(lines)
+
+    def _write_shared_comparison(self, command, lines):
+        """Writes a comparison through its routine."""
+        routine = COMPARISON_ROUTINE.format(command, self.filename)
+        lines.extend(["@{}$ret.{}".format(routine, self.label_num),
+                      "D=A",
+                      "@{}".format(routine),
+                      "0;JMP",
+                      "({}$ret.{})".format(routine, self.label_num)])
+        self.label_num += 1
+
     def _write_arithmetic_case_comparison(self, command, lines):
         """The helper method for the write_arithmetic method for the case that
         the current command is a comparison binary command."""
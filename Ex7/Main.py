@@ -4,25 +4,27 @@ https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
 and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0 
 Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
 """
+import argparse
 import os
-import sys
 import typing
 from Parser import Parser
 from CodeWriter import CodeWriter
 
 
-def translate_file(input_file: typing.TextIO,
-                   output_file: typing.TextIO) -> None:
+def translate_file(input_file: typing.TextIO, output_file: typing.TextIO,
+                   shared_comparisons: bool = False) -> None:
     """Translates a single file.
 
     Args:
         input_file (typing.TextIO): the file to translate.
         output_file (typing.TextIO): writes all output to this file.
+        shared_comparisons (bool): whether to translate comparisons into
+        calls of shared routines (see CodeWriter).
     """
     input_filename, input_extension = os.path.splitext(os.path.basename(
         input_file.name))
     parser = Parser(input_file)
-    code_writer = CodeWriter(output_file)
+    code_writer = CodeWriter(output_file, shared_comparisons)
     code_writer.set_file_name(input_filename)
     while parser.has_more_commands():
         if parser.command_type() == "C_ARITHMETIC":
@@ -41,9 +43,16 @@ if "__main__" == __name__:
     # Both are closed automatically when the code finishes running.
     # If the output file does not exist, it is created automatically in the
     # correct path, using the correct filename.
-    if not len(sys.argv) == 2:
-        sys.exit("Invalid usage, please use: VMtranslator <input path>")
-    argument_path = os.path.abspath(sys.argv[1])
+    arguments_parser = argparse.ArgumentParser(
+        prog="VMtranslator",
+        usage="VMtranslator [--shared-comparisons] <input path>")
+    arguments_parser.add_argument("input_path")
+    arguments_parser.add_argument(
+        "--shared-comparisons", action="store_true",
+        help="translate eq, gt and lt into calls of three shared routines, "
+             "for smaller code")
+    arguments = arguments_parser.parse_args()
+    argument_path = os.path.abspath(arguments.input_path)
     if os.path.isdir(argument_path):
         files_to_translate = [
             os.path.join(argument_path, filename)
@@ -60,4 +69,5 @@ if "__main__" == __name__:
             if extension.lower() != ".vm":
                 continue
             with open(input_path, 'r') as input_file:
-                translate_file(input_file, output_file)
+                translate_file(input_file, output_file,
+                               arguments.shared_comparisons)
@@ -16,18 +16,56 @@ COMPARISON_BINARY = ["eq", "gt", "lt"]
 SEGMENTS = {"local": "LCL", "argument": "ARG", "this": "THIS",
             "that": "THAT", "pointer": 3, "temp": 5, "static": 16}
 STACK_START = 256
+# The labels of the routines that all the calls and returns share, in the
+# shared calls mode. They look like functions to the profiler of the CPU
+# emulator, so the time spent in them is shown apart:
+CALL_ROUTINE = "VM.call"
+RETURN_ROUTINE = "VM.return"
+# The label of the routine of every comparison, in the shared comparisons
+# mode, like VM.lt:
+COMPARISON_ROUTINE = "VM.{}"
+# The D register operations of the unary commands, when the top of the stack
+# is cached in D:
+CACHED_UNARY = {"neg": "D=-D", "not": "D=!D", "shiftleft": "D=D<<",
+                "shiftright": "D=D>>"}
+# The D register operations of add, sub, and and or, with y in D and x in M:
+CACHED_BINARY = {"add": "D=D+M", "sub": "D=M-D", "and": "D=D&M",
+                 "or": "D=D|M"}
+# A pop into local, argument, this or that, when the value is in D, moves A to
+# the address one step at a time up to this index:
+MAX_STEPPED_INDEX = 6
 
 
 class CodeWriter:
     """Translates VM commands into Hack assembly code."""
 
-    def __init__(self, output_stream: typing.TextIO) -> None:
+    def __init__(self, output_stream: typing.TextIO,
+                 shared_calls: bool = False,
+                 shared_comparisons: bool = False,
+                 cache_top: bool = False) -> None:
         """Initializes the CodeWriter.
 
         Args:
             output_stream (typing.TextIO): output stream.
+            shared_calls (bool): whether to write the frame handling of call
+            and return once, in routines that write_init writes: a call then
+            takes about 11 instructions instead of 45, and a return 2 instead
+            of 40, for a few more executed instructions per call.
+            shared_comparisons (bool): whether to write eq, gt and lt once,
+            in routines that write_init writes: a comparison then takes 4
+            instructions instead of up to 35. The routines get the return
+            address in D, and keep it in R15.
+            cache_top (bool): whether to keep the value at the top of the
+            stack in D between commands, instead of pushing it and popping it
+            again right away. The cached value is pushed (flushed) before
+            labels, jumps, calls and returns, so the stack is in memory
+            wherever control flow meets.
         """
         self.__output_stream = output_stream
+        self.__shared_calls = shared_calls
+        self.__shared_comparisons = shared_comparisons
+        self.__cache_top = cache_top
+        self.__top_in_d = False  # whether the top of the stack is only in D.
         self.__filename = ""
         self.__current_function = ""
         self.__return_label_num = 0
@@ -52,6 +90,20 @@ class CodeWriter:
                  "M=D"]
         self._write_to_stream(lines)
         self.write_call("Sys.init", 0)  # call Sys.init with 0 args.
+        if self.__shared_calls:  # Sys.init never returns to here.
+            self._write_call_routine()
+            self._write_return_routine()
+        if self.__shared_comparisons:
+            for command in COMPARISON_BINARY:
+                self._write_comparison_routine(command)
+
+    def write_comment(self, comment: str) -> None:
+        """Writes a comment line, which the assembler ignores.
+
+        Args:
+            comment (str): the text of the comment.
+        """
+        self._write_to_stream(["// " + comment])
 
     def write_arithmetic(self, command: str) -> None:
         """Writes the assembly code that is the translation of the given
@@ -60,8 +112,13 @@ class CodeWriter:
         Args:
             command (str): an arithmetic command.
         """
+        if self.__cache_top:
+            self._write_cached_arithmetic(command)
+            return
         lines = list()
-        if command in PRE_UNARY:
+        if command in COMPARISON_BINARY and self.__shared_comparisons:
+            self._write_shared_comparison(command, lines)
+        elif command in PRE_UNARY:
             CodeWriter._get_last_stack_address(lines)
             lines.append("M={}M".format(ARITHMETIC_TRANSLATE[command]))
         elif command in POST_UNARY:
@@ -80,6 +137,9 @@ class CodeWriter:
             segment (str): the memory segment to operate on.
             index (int): the index in the memory segment.
         """
+        if self.__cache_top:
+            self._write_cached_push_pop(command, segment, index)
+            return
         lines = list()
         self._get_data_address(segment, index, lines)
         if command == "C_PUSH":
@@ -88,12 +148,57 @@ class CodeWriter:
             CodeWriter._write_case_pop(lines, segment)
         self._write_to_stream(lines)
 
+    def write_arithmetic_constant(self, command: str, constant: int) -> None:
+        """Writes the assembly code of push constant followed by a binary
+        command, without pushing the constant.
+
+        Args:
+            command (str): add, sub, and or or.
+            constant (int): the constant.
+        """
+        operator = ARITHMETIC_TRANSLATE[command]
+        if self.__top_in_d:
+            if constant == 1 and command in ["add", "sub"]:
+                lines = ["D=D{}1".format(operator)]
+            else:
+                lines = ["@{}".format(constant),
+                         "D=D{}A".format(operator)]
+        else:
+            lines = list()
+            if constant == 1 and command in ["add", "sub"]:
+                CodeWriter._get_last_stack_address(lines)
+                lines.append("M=M{}1".format(operator))
+            else:
+                lines.extend(["@{}".format(constant),
+                              "D=A"])
+                CodeWriter._get_last_stack_address(lines)
+                lines.append("M=M{}D".format(operator))
+        self._write_to_stream(lines)
+
+    def write_move(self, segment: str, index: int, target_segment: str,
+                   target_index: int) -> None:
+        """Writes the assembly code of a push followed by a pop, which copies
+        the value through D, without the stack.
+
+        Args:
+            segment (str): the segment to push from.
+            index (int): the index in segment.
+            target_segment (str): the segment to pop into.
+            target_index (int): the index in target_segment.
+        """
+        assert target_segment != "constant"
+        self._flush_top()
+        self._write_to_stream(self._load_lines(segment, index) +
+                              self._store_lines(target_segment,
+                                                target_index))
+
     def write_label(self, label: str) -> None:
         """Writes the assembly code that effects the label command.
 
         Args:
             label (str): the label to create.
         """
+        self._flush_top()
         self._write_to_stream(["({}${})".format(self.__current_function,
                                                 label)])
 
@@ -103,6 +208,7 @@ class CodeWriter:
         Args:
             label (str): the label to go to.
         """
+        self._flush_top()
         lines = ["@{}${}".format(self.__current_function, label),
                  "0;JMP"]
         self._write_to_stream(lines)
@@ -115,11 +221,30 @@ class CodeWriter:
             stack is True.
         """
         lines = list()
-        self._pop_stack_and_decrement_stack_pointer(lines)
+        if self.__top_in_d:  # the condition is already in D.
+            self.__top_in_d = False
+        else:
+            self._pop_stack_and_decrement_stack_pointer(lines)
         lines.extend(["@{}${}".format(self.__current_function, label),
                       "D;JNE"])
         self._write_to_stream(lines)
 
+    def write_if_not(self, label: str) -> None:
+        """Writes the assembly code of not followed by if-goto.
+
+        Args:
+            label (str): the label to go to if the bitwise not of the top
+            value on the stack is nonzero, that is, if the value is not -1.
+        """
+        lines = list()
+        if self.__top_in_d:
+            self.__top_in_d = False
+        else:
+            self._pop_stack_and_decrement_stack_pointer(lines)
+        lines.extend(["@{}${}".format(self.__current_function, label),
+                      "D+1;JNE"])  # !x != 0 exactly when x+1 != 0.
+        self._write_to_stream(lines)
+
     def write_function(self, function_name: str, num_vars: int) -> None:
         """Writes the assembly code that effects the function command.
 
@@ -127,6 +252,7 @@ class CodeWriter:
             function_name (str): the name of the function to implement.
             num_vars (int): the number of variables the function has.
         """
+        self._flush_top()
         self.__current_function = function_name
         lines = ["({})".format(function_name)]
         for i in range(num_vars):  # repeat nVars times: push 0.
@@ -141,8 +267,12 @@ class CodeWriter:
             function_name (str): the name of the function to call.
             num_args (int): the number of arguments the function needs.
         """
+        self._flush_top()
         i = self.__return_label_num
         self.__return_label_num += 1
+        if self.__shared_calls:
+            self._write_shared_call(function_name, num_args, i)
+            return
         lines = ["@{}$ret.{}".format(function_name, i)]  # push return address.
         self._write_case_push(lines, "constant")
         lines.extend(["@LCL"])  # push LCL.
@@ -168,6 +298,17 @@ class CodeWriter:
 
     def write_return(self) -> None:
         """Writes the assembly code that effects the return command."""
+        self._flush_top()
+        if self.__shared_calls:
+            self._write_to_stream(["@{}".format(RETURN_ROUTINE), "0;JMP"])
+            return
+        self._write_to_stream(CodeWriter._return_lines())
+
+    # HELP METHODS:
+
+    @staticmethod
+    def _return_lines():
+        """Returns the assembly code of a return."""
         lines = ["@LCL",  # frame = LCL (store into R14).
                  "D=M",
                  "@R14",
@@ -179,7 +320,7 @@ class CodeWriter:
                  "M=D",
                  "@ARG",  # *ARG = pop().
                  "A=M"]
-        self._write_case_pop(lines, "argument")
+        CodeWriter._write_case_pop(lines, "argument")
         lines.extend(["@ARG",  # SP = ARG+1.
                       "D=M+1",
                       "@SP",
@@ -194,9 +335,59 @@ class CodeWriter:
         lines.extend(["@R15",  # goto retAddr.
                       "A=M",
                       "0;JMP"])
+        return lines
+
+    def _write_shared_call(self, function_name, num_args, i):
+        """Writes a call through the call routine: R15 = the return address,
+        R14 = the address of the function, D = nArgs."""
+        lines = ["@{}$ret.{}".format(function_name, i),
+                 "D=A",
+                 "@R15",
+                 "M=D",
+                 "@{}".format(function_name),
+                 "D=A",
+                 "@R14",
+                 "M=D"]
+        if num_args <= 1:
+            lines.append("D={}".format(num_args))
+        else:
+            lines.extend(["@{}".format(num_args),
+                          "D=A"])
+        lines.extend(["@{}".format(CALL_ROUTINE),
+                      "0;JMP",
+                      "({}$ret.{})".format(function_name, i)])
         self._write_to_stream(lines)
 
-    # HELP METHODS:
+    def _write_call_routine(self):
+        """Writes the routine that the calls share, which pushes the frame of
+        the caller, sets ARG and LCL and jumps to the function."""
+        lines = ["({})".format(CALL_ROUTINE),
+                 "@R13",  # R13 = nArgs.
+                 "M=D",
+                 "@R15"]  # push return address.
+        self._write_case_push(lines, "return address")
+        for address in ["@LCL", "@ARG", "@THIS", "@THAT"]:
+            lines.append(address)  # push LCL, ARG, THIS and THAT.
+            self._write_case_push(lines, address)
+        lines.extend(["@SP",  # LCL = SP.
+                      "D=M",
+                      "@LCL",
+                      "M=D",
+                      "@R13",  # ARG = SP-5-nArgs.
+                      "D=D-M",
+                      "@5",
+                      "D=D-A",
+                      "@ARG",
+                      "M=D",
+                      "@R14",  # goto f.
+                      "A=M",
+                      "0;JMP"])
+        self._write_to_stream(lines)
+
+    def _write_return_routine(self):
+        """Writes the routine that the returns share."""
+        self._write_to_stream(["({})".format(RETURN_ROUTINE)] +
+                              CodeWriter._return_lines())
 
     @staticmethod
     def _pop_stack_and_decrement_stack_pointer(lines):
@@ -217,7 +408,7 @@ class CodeWriter:
         negative."""
         # R15 is already in D.
         lines.extend(["@CONTINUE1_{}".format(self.__comparison_label_num),
-                      "D;JGT",
+                      "D;JGE",
                       "@R14",
                       "D=M",
                       "@CONTINUE1_{}".format(self.__comparison_label_num),
@@ -241,7 +432,7 @@ class CodeWriter:
                       "@R14",
                       "D=M",
                       "@CONTINUE2_{}".format(self.__comparison_label_num),
-                      "D;JGT"])
+                      "D;JGE"])
         CodeWriter._get_last_stack_address(lines)
         if command == "lt":
             lines.append("M=0")
@@ -267,6 +458,67 @@ class CodeWriter:
         lines.extend(["M=-1",
                       "(CONTINUE3_{})".format(self.__comparison_label_num)])
 
+    def _write_comparison_routine(self, command):
+        """Writes the routine of a comparison, which replaces the two values
+        at the top of the stack with the result, and returns to the address
+        in D."""
+        routine = COMPARISON_ROUTINE.format(command)
+        lines = ["({})".format(routine),
+                 "@R15",  # R15 = the return address.
+                 "M=D"]
+        CodeWriter._pop_stack_and_decrement_stack_pointer(lines)
+        lines.extend(["@R14",  # R14 = y.
+                      "M=D"])
+        CodeWriter._get_last_stack_address(lines)
+        lines.append("D=M")  # D = x.
+        if command != "eq":  # when the signs differ, x-y can overflow.
+            positive_x_result = "false" if command == "lt" else "true"
+            negative_x_result = "true" if command == "lt" else "false"
+            lines.extend(["@{}$negative_x".format(routine),
+                          "D;JLT",
+                          "@R14",
+                          "D=M",
+                          "@{}${}".format(routine, positive_x_result),
+                          "D;JLT",
+                          "@{}$same_sign".format(routine),
+                          "0;JMP",
+                          "({}$negative_x)".format(routine),
+                          "@R14",
+                          "D=M",
+                          "@{}${}".format(routine, negative_x_result),
+                          "D;JGE",
+                          "({}$same_sign)".format(routine)])
+            CodeWriter._get_last_stack_address(lines)
+            lines.append("D=M")
+        lines.extend(["@R14",
+                      "D=D-M",
+                      "@{}$true".format(routine),
+                      "D;{}".format(ARITHMETIC_TRANSLATE[command]),
+                      "({}$false)".format(routine)])
+        CodeWriter._get_last_stack_address(lines)
+        lines.extend(["M=0",
+                      "@R15",
+                      "A=M",
+                      "0;JMP",
+                      "({}$true)".format(routine)])
+        CodeWriter._get_last_stack_address(lines)
+        lines.extend(["M=-1",
+                      "@R15",
+                      "A=M",
+                      "0;JMP"])
+        self._write_to_stream(lines)
+
+    def _write_shared_comparison(self, command, lines):
+        """Writes a comparison through its routine."""
+        routine = COMPARISON_ROUTINE.format(command)
+        i = self.__return_label_num
+        self.__return_label_num += 1
+        lines.extend(["@{}$ret.{}".format(routine, i),
+                      "D=A",
+                      "@{}".format(routine),
+                      "0;JMP",
+                      "({}$ret.{})".format(routine, i)])
+
     def _write_arithmetic_case_comparison(self, command, lines):
         """The helper method for the write_arithmetic method for the case that
         the current command is a comparison binary command."""
@@ -337,6 +589,102 @@ class CodeWriter:
                       "A=M",
                       "M=D"])
 
+    def _flush_top(self):
+        """Pushes the top of the stack, if it is cached in D."""
+        if self.__top_in_d:
+            self._write_to_stream(["@SP",
+                                   "AM=M+1",
+                                   "A=A-1",
+                                   "M=D"])
+            self.__top_in_d = False
+
+    def _write_cached_arithmetic(self, command):
+        """The write_arithmetic method of the cache_top mode. Leaves the
+        result in D, except for the comparisons."""
+        lines = list()
+        if command in CACHED_UNARY:
+            if not self.__top_in_d:
+                CodeWriter._pop_stack_and_decrement_stack_pointer(lines)
+            lines.append(CACHED_UNARY[command])
+            self.__top_in_d = True
+        elif command in CACHED_BINARY:
+            if not self.__top_in_d:  # D = y.
+                CodeWriter._pop_stack_and_decrement_stack_pointer(lines)
+            lines.extend(["@SP",  # pop x into M.
+                          "AM=M-1",
+                          CACHED_BINARY[command]])
+            self.__top_in_d = True
+        elif self.__shared_comparisons:  # the routines pop both values.
+            self._flush_top()
+            self._write_shared_comparison(command, lines)
+        else:
+            if not self.__top_in_d:  # D = y.
+                CodeWriter._pop_stack_and_decrement_stack_pointer(lines)
+            self.__top_in_d = False
+            self._write_arithmetic_case_comparison(command, lines)
+        self._write_to_stream(lines)
+
+    def _write_cached_push_pop(self, command, segment, index):
+        """The write_push_pop method of the cache_top mode. A push leaves the
+        value in D, and a pop stores D."""
+        if command == "C_PUSH":
+            self._flush_top()
+            lines = self._load_lines(segment, index)
+            self.__top_in_d = True
+        else:
+            assert segment != "constant"
+            lines = list()
+            if not self.__top_in_d:
+                CodeWriter._pop_stack_and_decrement_stack_pointer(lines)
+            lines.extend(self._store_lines(segment, index))
+            self.__top_in_d = False
+        self._write_to_stream(lines)
+
+    def _load_lines(self, segment, index):
+        """Returns the assembly code that sets D to the value at index in
+        segment (or to the constant)."""
+        if segment == "constant":
+            if index <= 1:
+                return ["D={}".format(index)]
+            return ["@{}".format(index),
+                    "D=A"]
+        if segment in ["static", "pointer", "temp"]:
+            lines = list()
+            self._get_data_address(segment, index, lines)
+            return lines + ["D=M"]
+        if index <= 1:
+            return ["@{}".format(SEGMENTS[segment]),
+                    "A=M+1" if index else "A=M",
+                    "D=M"]
+        return ["@{}".format(index),
+                "D=A",
+                "@{}".format(SEGMENTS[segment]),
+                "A=D+M",
+                "D=M"]
+
+    def _store_lines(self, segment, index):
+        """Returns the assembly code that stores D at index in segment."""
+        if segment in ["static", "pointer", "temp"]:
+            lines = list()
+            self._get_data_address(segment, index, lines)
+            return lines + ["M=D"]
+        if index <= MAX_STEPPED_INDEX:
+            return ["@{}".format(SEGMENTS[segment]),
+                    "A=M"] + ["A=A+1"] * index + ["M=D"]
+        return ["@R13",  # R13 = the value.
+                "M=D",
+                "@{}".format(index),  # R14 = the address.
+                "D=A",
+                "@{}".format(SEGMENTS[segment]),
+                "D=D+M",
+                "@R14",
+                "M=D",
+                "@R13",
+                "D=M",
+                "@R14",
+                "A=M",
+                "M=D"]
+
     def _write_to_stream(self, lines):
         """Writes every line in the lines sequence to the output stream."""
         for line in lines:
@@ -4,46 +4,71 @@ https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
 and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0 
 Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
 """
+import argparse
 import os
-import sys
 import typing
-from Parser import Parser
 from CodeWriter import CodeWriter
+from Optimizer import Optimizer, Command, C_ARITHMETIC_CONSTANT, C_MOVE
 
+ANNOTATION_PREFIX = "vm: "
 
-def translate_file(input_file: typing.TextIO,
-                   code_writer: CodeWriter) -> None:
+
+def translate_file(input_file: typing.TextIO, code_writer: CodeWriter,
+                   annotate: bool = False, optimize: bool = False) -> None:
     """Translates a single file.
 
     Args:
         input_file (typing.TextIO): the file to translate.
         code_writer (CodeWriter): translates all the commands and writes them
         into the output file.
+        annotate (bool): whether to write every VM command as a comment
+        before its translation, so tools can map assembly lines (and ROM
+        addresses, through the assembler's source map) back to VM commands.
+        optimize (bool): whether to rewrite the commands with the Optimizer
+        passes first.
     """
     input_filename, input_extension = os.path.splitext(os.path.basename(
         input_file.name))
-    parser = Parser(input_file)
+    commands = Optimizer.read_commands(input_file)
+    if optimize:
+        commands = Optimizer.fuse(Optimizer.fold_constants(commands))
     code_writer.set_file_name(input_filename)
-    while parser.has_more_commands():
-        command_type = parser.command_type()
-        if command_type == "C_ARITHMETIC":
-            code_writer.write_arithmetic(parser.arg1())
-        elif command_type in ["C_PUSH", "C_POP"]:
-            code_writer.write_push_pop(command_type, parser.arg1(),
-                                       parser.arg2())
-        elif command_type == "C_LABEL":
-            code_writer.write_label(parser.arg1())
-        elif command_type == "C_GOTO":
-            code_writer.write_goto(parser.arg1())
-        elif command_type == "C_IF":
-            code_writer.write_if(parser.arg1())
-        elif command_type == "C_FUNCTION":
-            code_writer.write_function(parser.arg1(), parser.arg2())
-        elif command_type == "C_RETURN":
-            code_writer.write_return()
-        else:  # case call.
-            code_writer.write_call(parser.arg1(), parser.arg2())
-        parser.advance()
+    for command in commands:
+        if annotate:
+            code_writer.write_comment(ANNOTATION_PREFIX + command[0])
+        write_command(command, code_writer)
+
+
+def write_command(command: Command, code_writer: CodeWriter) -> None:
+    """Translates a single command.
+
+    Args:
+        command (Command): the command, as read by Optimizer.read_commands.
+        code_writer (CodeWriter): writes the translation.
+    """
+    command_type, arguments = command[1], command[2:]
+    if command_type == "C_ARITHMETIC":
+        code_writer.write_arithmetic(*arguments)
+    elif command_type in ["C_PUSH", "C_POP"]:
+        code_writer.write_push_pop(command_type, *arguments)
+    elif command_type == "C_LABEL":
+        code_writer.write_label(*arguments)
+    elif command_type == "C_GOTO":
+        code_writer.write_goto(*arguments)
+    elif command_type == "C_IF":
+        code_writer.write_if(*arguments)
+    elif command_type == "C_FUNCTION":
+        code_writer.write_function(*arguments)
+    elif command_type == "C_RETURN":
+        code_writer.write_return()
+    elif command_type == "C_CALL":
+        code_writer.write_call(*arguments)
+    elif command_type == C_ARITHMETIC_CONSTANT:
+        code_writer.write_arithmetic_constant(*arguments)
+    elif command_type == C_MOVE:
+        code_writer.write_move(*arguments)
+    else:  # case C_IF_NOT.
+        code_writer.write_if_not(*arguments)
 
 
 if "__main__" == __name__:
@@ -52,9 +77,32 @@ if "__main__" == __name__:
     # Both are closed automatically when the code finishes running.
     # If the output file does not exist, it is created automatically in the
     # correct path, using the correct filename.
-    if not len(sys.argv) == 2:
-        sys.exit("Invalid usage, please use: VMtranslator <input path>")
-    argument_path = os.path.abspath(sys.argv[1])
+    arguments_parser = argparse.ArgumentParser(
+        prog="VMtranslator",
+        usage="VMtranslator [--annotate] [--shared-calls] "
+              "[--shared-comparisons] [--cache-top] [--optimize] <input path>")
+    arguments_parser.add_argument("input_path")
+    arguments_parser.add_argument(
+        "--annotate", action="store_true",
+        help="write every VM command as a comment before its translation")
+    arguments_parser.add_argument(
+        "--shared-calls", action="store_true",
+        help="translate calls and returns into jumps to two shared routines, "
+             "for smaller code")
+    arguments_parser.add_argument(
+        "--shared-comparisons", action="store_true",
+        help="translate eq, gt and lt into calls of three shared routines, "
+             "for smaller code")
+    arguments_parser.add_argument(
+        "--cache-top", action="store_true",
+        help="keep the top of the stack in the D register between commands, "
+             "for faster code")
+    arguments_parser.add_argument(
+        "--optimize", action="store_true",
+        help="fold constants, remove unreachable code and fuse common "
+             "sequences of commands into specialized code")
+    arguments = arguments_parser.parse_args()
+    argument_path = os.path.abspath(arguments.input_path)
     if os.path.isdir(argument_path):
         files_to_translate = [
             os.path.join(argument_path, filename)
@@ -66,11 +114,18 @@ if "__main__" == __name__:
         output_path, extension = os.path.splitext(argument_path)
     output_path += ".asm"
     with open(output_path, 'w') as output_file:
-        code_writer = CodeWriter(output_file)  # create a CodeWriter object.
+        # create a CodeWriter object.
+        code_writer = CodeWriter(output_file, arguments.shared_calls,
+                                 arguments.shared_comparisons,
+                                 arguments.cache_top)
+        if arguments.annotate:
+            code_writer.write_comment(ANNOTATION_PREFIX + "bootstrap")
         code_writer.write_init()  # initialize the VM.
         for input_path in files_to_translate:
             filename, extension = os.path.splitext(input_path)
             if extension.lower() != ".vm":
                 continue
             with open(input_path, 'r') as input_file:
-                translate_file(input_file, code_writer)  # translate the file.
+                translate_file(input_file, code_writer,
+                               arguments.annotate,
+                               arguments.optimize)  # translate the file.
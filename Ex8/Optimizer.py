@@ -0,0 +1,214 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in  
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0 
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import typing
+from Parser import Parser
+
+# A VM command is a tuple of its text, its type (as returned by
+# Parser.command_type, or one of the types of the superinstructions below)
+# and its arguments, like ("push local 2", "C_PUSH", "local", 2).
+Command = typing.Tuple
+# The superinstructions that fuse writes, which CodeWriter translates into
+# specialized code:
+C_ARITHMETIC_CONSTANT = "C_ARITHMETIC_CONSTANT"  # (command, constant).
+C_MOVE = "C_MOVE"  # (segment, index, target segment, target index).
+# (label): jumps if the bitwise not of the popped value is nonzero, like
+# not; if-goto, that is, if the value is not -1 (true):
+C_IF_NOT = "C_IF_NOT"
+CONSTANT_BINARY = ["add", "sub", "and", "or"]
+FUSED_SEPARATOR = "; "  # between the texts of fused commands.
+WORD_MASK = 0xFFFF
+SIGN_BIT = 0x8000
+MAX_CONSTANT = 0x7FFF  # the largest constant that push constant takes.
+TRUE = WORD_MASK
+# The arithmetic commands on 16-bit words, as the Hack code computes them
+# (the comparisons are signed, which flipping the sign bits makes unsigned):
+UNARY_FOLDS = {
+    "neg": lambda x: -x & WORD_MASK,
+    "not": lambda x: x ^ WORD_MASK,
+    "shiftleft": lambda x: (x << 1) & WORD_MASK,
+    "shiftright": lambda x: (x >> 1) | (x & SIGN_BIT)}
+BINARY_FOLDS = {
+    "add": lambda x, y: (x + y) & WORD_MASK,
+    "sub": lambda x, y: (x - y) & WORD_MASK,
+    "and": lambda x, y: x & y,
+    "or": lambda x, y: x | y,
+    "eq": lambda x, y: TRUE if x == y else 0,
+    "gt": lambda x, y: TRUE if x ^ SIGN_BIT > y ^ SIGN_BIT else 0,
+    "lt": lambda x, y: TRUE if x ^ SIGN_BIT < y ^ SIGN_BIT else 0}
+# The commands that never continue to the next command:
+UNCONDITIONAL_JUMPS = ["C_GOTO", "C_RETURN"]
+
+
+class Optimizer:
+    """Rewrites the VM commands of a file before CodeWriter translates them.
+    The commands are read into a list first, so the passes can look at the
+    commands around each one."""
+
+    @staticmethod
+    def read_commands(input_file: typing.TextIO) -> typing.List[Command]:
+        """Reads all the commands of a VM file.
+
+        Args:
+            input_file (typing.TextIO): the file to read.
+
+        Returns:
+            typing.List[Command]: the commands of the file, in order.
+        """
+        parser = Parser(input_file)
+        commands = list()
+        while parser.has_more_commands():
+            command_type = parser.command_type()
+            if command_type == "C_RETURN":
+                arguments = ()
+            elif command_type in ["C_ARITHMETIC", "C_LABEL", "C_GOTO",
+                                  "C_IF"]:
+                arguments = (parser.arg1(),)
+            else:
+                arguments = (parser.arg1(), parser.arg2())
+            commands.append((parser.command(), command_type) + arguments)
+            parser.advance()
+        return commands
+
+    @staticmethod
+    def fold_constants(commands: typing.List[Command]) -> \
+            typing.List[Command]:
+        """Computes the arithmetic commands whose operands are constants
+        pushed right before them, and replaces them with a push of the
+        result (a word above MAX_CONSTANT is pushed as push constant and
+        not). An if-goto on a constant becomes a goto, or is removed with the
+        constant. Then the commands that can no longer run (after a goto or
+        a return, up to the next label or function) are removed, and so are
+        gotos to the label right after them.
+        Jack compiles true into push constant 0; not, so every
+        while (true) loop starts with an if-goto on a constant.
+
+        Args:
+            commands (typing.List[Command]): the commands to rewrite.
+
+        Returns:
+            typing.List[Command]: the rewritten commands.
+        """
+        folded = list()
+        for command in commands:
+            command_type, argument = command[1], command[2:3]
+            y, y_length = Optimizer._constant_before(folded, len(folded))
+            if command_type == "C_ARITHMETIC" and y_length and \
+                    argument[0] in UNARY_FOLDS:
+                del folded[-y_length:]
+                folded.extend(Optimizer._push_constant(
+                    UNARY_FOLDS[argument[0]](y)))
+                continue
+            if command_type == "C_ARITHMETIC" and y_length and \
+                    argument[0] in BINARY_FOLDS:
+                x, x_length = Optimizer._constant_before(
+                    folded, len(folded) - y_length)
+                if x_length:
+                    del folded[-(x_length + y_length):]
+                    folded.extend(Optimizer._push_constant(
+                        BINARY_FOLDS[argument[0]](x, y)))
+                    continue
+            if command_type == "C_IF" and y_length:
+                del folded[-y_length:]
+                if y:
+                    folded.append(("goto " + argument[0], "C_GOTO") +
+                                  argument)
+                continue
+            folded.append(command)
+        return Optimizer._remove_unreachable(folded)
+
+    @staticmethod
+    def fuse(commands: typing.List[Command]) -> typing.List[Command]:
+        """Replaces common sequences of commands with superinstructions, that
+        keep the intermediate values off the stack:
+        push constant k; add (or sub, and, or) -> C_ARITHMETIC_CONSTANT,
+        push X; pop Y -> C_MOVE,
+        push constant 0; not; if-goto L -> goto L (an always true condition),
+        not; if-goto L -> C_IF_NOT.
+        Jack compiles every if and while into not; if-goto (see
+        VMWriter.write_if).
+
+        Args:
+            commands (typing.List[Command]): the commands to rewrite.
+
+        Returns:
+            typing.List[Command]: the rewritten commands.
+        """
+        fused = list()
+        i = 0
+        while i < len(commands):
+            command, length = Optimizer._fuse_at(commands, i)
+            if length > 1:
+                text = FUSED_SEPARATOR.join(
+                    [command[0] for command in commands[i:i + length]])
+                command = (text,) + command[1:]
+            fused.append(command)
+            i += length
+        return fused
+
+    # HELP METHODS:
+
+    @staticmethod
+    def _constant_before(commands, end):
+        """Returns the word that the commands right before index end push, if
+        they push a constant as _push_constant writes it, and the number of
+        these commands (0 if they do not push a constant)."""
+        if end >= 1 and commands[end - 1][1:3] == ("C_PUSH", "constant"):
+            return commands[end - 1][3], 1
+        if end >= 2 and commands[end - 1][1:] == ("C_ARITHMETIC", "not") and \
+                commands[end - 2][1:3] == ("C_PUSH", "constant"):
+            return commands[end - 2][3] ^ WORD_MASK, 2
+        return None, 0
+
+    @staticmethod
+    def _push_constant(word):
+        """Returns the commands that push a word."""
+        if word <= MAX_CONSTANT:
+            return [("push constant {}".format(word), "C_PUSH", "constant",
+                     word)]
+        word ^= WORD_MASK
+        return [("push constant {}".format(word), "C_PUSH", "constant",
+                 word),
+                ("not", "C_ARITHMETIC", "not")]
+
+    @staticmethod
+    def _remove_unreachable(commands):
+        """Removes the commands after gotos and returns, up to the next label
+        or function, and the gotos to the label that follows them."""
+        kept = list()
+        reachable = True
+        for command in commands:
+            command_type = command[1]
+            if command_type in ["C_LABEL", "C_FUNCTION"]:
+                reachable = True
+                if command_type == "C_LABEL" and kept and \
+                        kept[-1][1:] == ("C_GOTO", command[2]):
+                    kept.pop()
+            if reachable:
+                kept.append(command)
+            if command_type in UNCONDITIONAL_JUMPS:
+                reachable = False
+        return kept
+
+    @staticmethod
+    def _fuse_at(commands, i):
+        """Returns the command that replaces the commands from index i, and
+        the number of replaced commands."""
+        first = commands[i][1:]
+        second = commands[i + 1][1:] if i + 1 < len(commands) else ()
+        third = commands[i + 2][1:] if i + 2 < len(commands) else ()
+        if first == ("C_PUSH", "constant", 0) and \
+                second == ("C_ARITHMETIC", "not") and third[:1] == ("C_IF",):
+            return (None, "C_GOTO", third[1]), 3
+        if first[:2] == ("C_PUSH", "constant") and \
+                second[:1] == ("C_ARITHMETIC",) and \
+                second[1] in CONSTANT_BINARY:
+            return (None, C_ARITHMETIC_CONSTANT, second[1], first[2]), 2
+        if first[:1] == ("C_PUSH",) and second[:1] == ("C_POP",):
+            return (None, C_MOVE) + first[1:] + second[1:], 2
+        if first == ("C_ARITHMETIC", "not") and second[:1] == ("C_IF",):
+            return (None, C_IF_NOT, second[1]), 2
+        return commands[i], 1
@@ -88,6 +88,14 @@ class Parser:
             return current_command
         return current_command.split()[1]
 
+    def command(self) -> str:
+        """
+        Returns:
+            str: the current command, without comments and surrounding white
+            space.
+        """
+        return self.__input[self.__current_command]
+
     def arg2(self) -> int:
         """
         Returns:
@@ -0,0 +1,339 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in  
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0 
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import argparse
+import array
+import os
+from Parser import Parser
+from CodeWriter import SEGMENTS, STACK_START
+
+RAM_SIZE = 32768
+KBD = 24576  # writes from the keyboard on are ignored, as in Memory.hdl.
+WORD_MASK = 0xFFFF
+ADDRESS_MASK = 0x7FFF
+SIGN_BIT = 0x8000
+TRUE = WORD_MASK
+# The registers, as laid out by CodeWriter:
+SP = 0
+LCL = 1
+ARG = 2
+THIS = 3
+THAT = 4
+FRAME_SIZE = 5  # the return address, LCL, ARG, THIS and THAT.
+# The operations of the compiled commands, roughly from the most common one:
+PUSH_CONSTANT = 0
+PUSH_SEGMENT = 1  # a segment that starts at the address in a register.
+PUSH_ADDRESS = 2  # a fixed address: static, temp or pointer.
+POP_SEGMENT = 3
+POP_ADDRESS = 4
+ADD = 5
+SUB = 6
+IF_GOTO = 7
+GOTO = 8
+CALL = 9
+FUNCTION = 10
+RETURN = 11
+LT = 12
+GT = 13
+EQ = 14
+NOT = 15
+NEG = 16
+AND = 17
+OR = 18
+SHIFT_LEFT = 19
+SHIFT_RIGHT = 20
+OPERATIONS = {"add": ADD, "sub": SUB, "lt": LT, "gt": GT, "eq": EQ,
+              "not": NOT, "neg": NEG, "and": AND, "or": OR,
+              "shiftleft": SHIFT_LEFT, "shiftright": SHIFT_RIGHT}
+
+
+class VMInterpreter:
+    """Executes VM programs directly, without translating and assembling
+    them. The commands of all the files are compiled into one list of
+    tuples of the form (operation, first operand, second operand), where
+    labels and functions are resolved to indexes into the list, and the
+    commands run on an array of unsigned 16-bit words, with the memory layout
+    of CodeWriter: the registers from 0, temp from 5, static from 16 and the
+    stack from STACK_START.
+
+    The static variables get the addresses that the assembler gives them
+    (the files are read in the order in which Main translates them), so
+    after a run the RAM matches that of the translated program, except for
+    the return addresses in the stack frames, which are command indexes here.
+    The stack pointer is kept in a local variable while the program runs,
+    and RAM[SP] is updated when run returns.
+    """
+
+    def __init__(self, input_path: str) -> None:
+        """Loads a program and runs its bootstrap code (SP = STACK_START and
+        call Sys.init), like CodeWriter.write_init.
+
+        Args:
+            input_path (str): a .vm file, or a directory of .vm files.
+        """
+        if os.path.isdir(input_path):
+            input_paths = [os.path.join(input_path, filename)
+                           for filename in os.listdir(input_path)]
+        else:
+            input_paths = [input_path]
+        self.ram = array.array("H", bytes(2 * RAM_SIZE))
+        self.steps = 0
+        self.__program = list()
+        self.__functions = dict()  # function name -> index.
+        self.__statics = dict()  # Xxx.i -> address.
+        calls = list()  # pairs of the form (index, function name).
+        for path in input_paths:
+            filename, extension = os.path.splitext(os.path.basename(path))
+            if extension.lower() != ".vm":
+                continue
+            with open(path, 'r') as input_file:
+                calls.extend(self._compile_file(Parser(input_file),
+                                                filename))
+        for index, function_name in calls:
+            operation, _, arguments = self.__program[index]
+            self.__program[index] = (operation,
+                                     self.__functions[function_name],
+                                     arguments)
+        assert len(self.__program) < WORD_MASK
+        # Sys.init returns to the end of the program, where the run stops:
+        self.pc = len(self.__program)
+        self.ram[SP] = STACK_START
+        self.ram[STACK_START:STACK_START + FRAME_SIZE] = array.array(
+            "H", [self.pc, 0, 0, 0, 0])
+        self.ram[SP] += FRAME_SIZE
+        self.ram[LCL] = self.ram[SP]
+        self.ram[ARG] = STACK_START
+        self.pc = self.__functions["Sys.init"]
+
+    def run(self, max_steps: int) -> int:
+        """Executes commands, until max_steps commands were executed or the
+        program halted.
+
+        Args:
+            max_steps (int): the number of commands to execute.
+
+        Returns:
+            int: the number of executed commands.
+        """
+        program = self.__program
+        end = len(program)
+        ram = self.ram
+        sp, pc = ram[SP], self.pc
+        steps = 0
+        while steps < max_steps and pc != end:
+            operation, x, y = program[pc]
+            pc += 1
+            steps += 1
+            if operation == PUSH_CONSTANT:
+                ram[sp] = x
+                sp += 1
+            elif operation == PUSH_SEGMENT:
+                ram[sp] = ram[(ram[x] + y) & ADDRESS_MASK]
+                sp += 1
+            elif operation == PUSH_ADDRESS:
+                ram[sp] = ram[x]
+                sp += 1
+            elif operation == POP_SEGMENT:
+                sp -= 1
+                address = (ram[x] + y) & ADDRESS_MASK
+                if address < KBD:
+                    ram[address] = ram[sp]
+            elif operation == POP_ADDRESS:
+                sp -= 1
+                ram[x] = ram[sp]
+            elif operation == ADD:
+                sp -= 1
+                ram[sp - 1] = (ram[sp - 1] + ram[sp]) & WORD_MASK
+            elif operation == SUB:
+                sp -= 1
+                ram[sp - 1] = (ram[sp - 1] - ram[sp]) & WORD_MASK
+            elif operation == IF_GOTO:
+                sp -= 1
+                if ram[sp]:
+                    pc = x
+            elif operation == GOTO:
+                pc = x
+            elif operation == CALL:
+                ram[sp] = pc
+                ram[sp + 1] = ram[LCL]
+                ram[sp + 2] = ram[ARG]
+                ram[sp + 3] = ram[THIS]
+                ram[sp + 4] = ram[THAT]
+                sp += FRAME_SIZE
+                ram[ARG] = sp - FRAME_SIZE - y
+                ram[LCL] = sp
+                pc = x
+            elif operation == FUNCTION:
+                ram[sp:sp + x] = array.array("H", bytes(2 * x))
+                sp += x
+            elif operation == RETURN:
+                frame = ram[LCL]
+                pc = ram[frame - 5]
+                argument = ram[ARG]
+                ram[argument] = ram[sp - 1]
+                sp = argument + 1
+                ram[THAT] = ram[frame - 1]
+                ram[THIS] = ram[frame - 2]
+                ram[ARG] = ram[frame - 3]
+                ram[LCL] = ram[frame - 4]
+            elif operation <= EQ:  # LT, GT or EQ, on signed words.
+                sp -= 1
+                first, second = ram[sp - 1] ^ SIGN_BIT, ram[sp] ^ SIGN_BIT
+                if operation == LT:
+                    ram[sp - 1] = TRUE if first < second else 0
+                elif operation == GT:
+                    ram[sp - 1] = TRUE if first > second else 0
+                else:
+                    ram[sp - 1] = TRUE if first == second else 0
+            elif operation == NOT:
+                ram[sp - 1] ^= WORD_MASK
+            elif operation == NEG:
+                ram[sp - 1] = -ram[sp - 1] & WORD_MASK
+            elif operation == AND:
+                sp -= 1
+                ram[sp - 1] &= ram[sp]
+            elif operation == OR:
+                sp -= 1
+                ram[sp - 1] |= ram[sp]
+            elif operation == SHIFT_LEFT:
+                ram[sp - 1] = (ram[sp - 1] << 1) & WORD_MASK
+            else:  # SHIFT_RIGHT, which keeps the sign.
+                ram[sp - 1] = (ram[sp - 1] >> 1) | (ram[sp - 1] & SIGN_BIT)
+        ram[SP] = sp
+        self.pc = pc
+        self.steps += steps
+        return steps
+
+    def set_key(self, key: int) -> None:
+        """Sets the code of the currently pressed key (0 for none).
+
+        Args:
+            key (int): the key code.
+        """
+        self.ram[KBD:] = array.array("H", [key]) * (RAM_SIZE - KBD)
+
+    def halted(self) -> bool:
+        """
+        Returns:
+            bool: True if Sys.init returned, or if the program is at a goto
+            to itself (like an empty while (true) loop).
+        """
+        return self.pc == len(self.__program) or \
+            self.__program[self.pc] == (GOTO, self.pc, 0)
+
+    def static_address(self, variable: str) -> int:
+        """
+        Args:
+            variable (str): a static variable, of the form Xxx.i, where Xxx is
+            the name of its file.
+
+        Returns:
+            int: its address in the RAM.
+        """
+        return self.__statics[variable]
+
+    # HELP METHODS:
+
+    def _compile_file(self, parser, filename):
+        """Compiles the commands of a file into the program, and returns the
+        calls, whose functions are resolved when all the files are
+        compiled, as pairs of the form (index, function name)."""
+        calls = list()
+        labels = dict()  # label -> index, in the current function.
+        jumps = list()  # pairs of the form (index, label).
+        while parser.has_more_commands():
+            command_type = parser.command_type()
+            if command_type == "C_ARITHMETIC":
+                command = (OPERATIONS[parser.arg1()], 0, 0)
+            elif command_type == "C_PUSH":
+                command = self._compile_push_pop(PUSH_CONSTANT, PUSH_SEGMENT,
+                                                 PUSH_ADDRESS, parser.arg1(),
+                                                 parser.arg2(), filename)
+            elif command_type == "C_POP":
+                command = self._compile_push_pop(None, POP_SEGMENT,
+                                                 POP_ADDRESS, parser.arg1(),
+                                                 parser.arg2(), filename)
+            elif command_type == "C_LABEL":
+                labels[parser.arg1()] = len(self.__program)
+                command = None
+            elif command_type in ["C_GOTO", "C_IF"]:
+                jumps.append((len(self.__program), parser.arg1()))
+                command = (GOTO if command_type == "C_GOTO" else IF_GOTO, 0,
+                           0)
+            elif command_type == "C_FUNCTION":
+                self._resolve_jumps(labels, jumps)
+                labels, jumps = dict(), list()
+                self.__functions[parser.arg1()] = len(self.__program)
+                command = (FUNCTION, parser.arg2(), 0)
+            elif command_type == "C_RETURN":
+                command = (RETURN, 0, 0)
+            else:  # case call.
+                calls.append((len(self.__program), parser.arg1()))
+                command = (CALL, 0, parser.arg2())
+            if command is not None:
+                self.__program.append(command)
+            parser.advance()
+        self._resolve_jumps(labels, jumps)
+        return calls
+
+    def _compile_push_pop(self, constant_operation, segment_operation,
+                          address_operation, segment, index, filename):
+        """Returns the command of a push or a pop."""
+        if segment == "constant":
+            assert constant_operation is not None
+            return constant_operation, index, 0
+        if segment == "static":
+            variable = "{}.{}".format(filename, index)
+            if variable not in self.__statics:  # as the assembler does.
+                self.__statics[variable] = SEGMENTS[segment] + len(
+                    self.__statics)
+            return address_operation, self.__statics[variable], 0
+        if segment in ["pointer", "temp"]:
+            return address_operation, SEGMENTS[segment] + index, 0
+        register = {"local": LCL, "argument": ARG, "this": THIS,
+                    "that": THAT}[segment]
+        return segment_operation, register, index
+
+    def _resolve_jumps(self, labels, jumps):
+        """Replaces the labels of the goto and if-goto commands of a function
+        with their indexes."""
+        for index, label in jumps:
+            operation = self.__program[index][0]
+            self.__program[index] = (operation, labels[label], 0)
+
+
+if "__main__" == __name__:
+    # Runs the program and prints the requested RAM words, as signed numbers.
+    arguments_parser = argparse.ArgumentParser(
+        prog="VMInterpreter",
+        usage="VMInterpreter <input path> [--max-steps N] [--key CODE] "
+              "[--print ADDRESS[-LAST] ...]")
+    # The path comes first, since --print would take it as an address:
+    arguments_parser.add_argument(
+        "input_path",
+        help="a .vm file or a directory of .vm files, before the options")
+    arguments_parser.add_argument(
+        "--max-steps", type=int, default=1000000, metavar="N",
+        help="the number of VM commands to execute")
+    arguments_parser.add_argument(
+        "--key", type=int, default=0,
+        help="the code of the key that is pressed during the run")
+    arguments_parser.add_argument(
+        "--print", nargs="+", default=[], metavar="ADDRESS[-LAST]",
+        help="RAM words to print after the run")
+    arguments = arguments_parser.parse_args()
+    interpreter = VMInterpreter(os.path.abspath(arguments.input_path))
+    interpreter.set_key(arguments.key)
+    interpreter.run(arguments.max_steps)
+    print("{} steps{}".format(interpreter.steps, ", halted"
+                              if interpreter.halted() else ""))
+    for addresses in arguments.print:
+        first, _, last = addresses.partition("-")
+        for ram_address in range(int(first, 0), int(last or first, 0) + 1):
+            word = interpreter.ram[ram_address]
+            print("RAM[{}] = {}".format(ram_address,
+                                        word - 0x10000 if word & SIGN_BIT
+                                        else word))
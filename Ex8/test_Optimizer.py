@@ -0,0 +1,109 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in  
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0 
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from Optimizer import Optimizer, C_IF_NOT
+from VMInterpreter import VMInterpreter
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ASSEMBLER = os.path.join(HERE, "..", "Ex6", "Main.py")
+EMULATOR = os.path.join(HERE, "..", "Ex5", "Main.py")
+MAX_CYCLES = 100000
+# Conditions of not; if-goto: besides false (0) and true (-1), any integer
+# is a condition in Jack, like if (p) for p = 5, and if (~p):
+CONDITIONS = [0, -1, 5, -6]
+TRANSLATOR_FLAGS = [[], ["--optimize"], ["--optimize", "--cache-top"],
+                    ["--optimize", "--cache-top", "--shared-calls",
+                     "--shared-comparisons"]]
+
+
+def if_program(conditions):
+    """Returns a Sys.vm that sets static i to 1 if not; if-goto on the i-th
+    condition jumps, and to 0 otherwise. The conditions go through a local,
+    so they are not constants."""
+    lines = ["function Sys.init 1"]
+    for i, condition in enumerate(conditions):
+        lines.append("push constant {}".format(abs(condition)))
+        if condition < 0:
+            lines.append("neg")
+        lines.extend(["pop local 0",
+                      "push local 0",
+                      "not",
+                      "if-goto TAKEN{}".format(i),
+                      "push constant 0",
+                      "pop static {}".format(i),
+                      "goto NEXT{}".format(i),
+                      "label TAKEN{}".format(i),
+                      "push constant 1",
+                      "pop static {}".format(i),
+                      "label NEXT{}".format(i)])
+    lines.extend(["label END", "goto END"])
+    return "\n".join(lines) + "\n"
+
+
+class OptimizerTest(unittest.TestCase):
+    """Tests the Optimizer passes, and runs the code that CodeWriter writes
+    for them on the CPU emulator (of Ex5, through the assembler of Ex6)."""
+
+    def test_fuse_not_if_goto(self):
+        commands = Optimizer.fuse(read_commands(
+            "push local 0\nnot\nif-goto L\n"))
+        self.assertEqual(commands, [("push local 0", "C_PUSH", "local", 0),
+                                    ("not; if-goto L", C_IF_NOT, "L")])
+
+    def test_if_not_on_integer_conditions(self):
+        with tempfile.TemporaryDirectory() as directory:
+            program = os.path.join(directory, "Sys.vm")
+            with open(program, 'w') as program_file:
+                program_file.write(if_program(CONDITIONS))
+            interpreter = VMInterpreter(directory)
+            interpreter.run(MAX_CYCLES)
+            addresses = [interpreter.static_address("Sys.{}".format(i))
+                         for i in range(len(CONDITIONS))]
+            expected = [interpreter.ram[address] for address in addresses]
+            self.assertEqual(expected, [1, 0, 1, 1])
+            for flags in TRANSLATOR_FLAGS:
+                with self.subTest(flags=flags):
+                    self.assertEqual(run_translated(program, flags,
+                                                    addresses), expected)
+
+
+def read_commands(source):
+    """Returns the commands of the VM code in source."""
+    input_file = io.StringIO(source)
+    input_file.name = "Test.vm"
+    return Optimizer.read_commands(input_file)
+
+
+def run_translated(program, flags, addresses):
+    """Translates, assembles and runs a .vm file, and returns the values at
+    the addresses."""
+    run_tool(os.path.join(HERE, "Main.py"), flags + [program])
+    asm_path = os.path.splitext(program)[0] + ".asm"
+    run_tool(ASSEMBLER, [asm_path])
+    output = run_tool(EMULATOR, [
+        os.path.splitext(program)[0] + ".hack", "--jit", "--idle",
+        "--max-cycles", str(MAX_CYCLES), "--print"] +
+        [str(address) for address in addresses])
+    return [int(line.split("=")[1]) for line in output.splitlines()]
+
+
+def run_tool(script, arguments):
+    """Runs a Python script of the repository, and returns its output."""
+    completed = subprocess.run([sys.executable, script] + arguments,
+                               cwd=os.path.dirname(script),
+                               stdout=subprocess.PIPE, check=True,
+                               universal_newlines=True)
+    return completed.stdout
+
+
+if "__main__" == __name__:
+    unittest.main()